@@ -0,0 +1,77 @@
+"""
+Lookup latency of a favourite by (user_id, planet_id) as the favourite table grows.
+
+    python benchmarks/favourite_lookup.py --sizes 10000,100000,1000000
+    python benchmarks/favourite_lookup.py --without-indexes
+
+Uses the tables defined in src/models.py on a SQLite file (or BENCH_DATABASE_URL).
+With the indexes the time per lookup should stay flat; without them it grows with the table.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from sqlalchemy import create_engine, insert, select
+from models import db, Favourites
+
+USERS = 10000
+
+
+def fill(connection, start, end):
+    # every user gets planets in order, so (user_id, planet_id) pairs never repeat
+    batch = []
+    for i in range(start, end):
+        batch.append({"user_id": i % USERS + 1, "planet_id": i // USERS + 1})
+        if len(batch) == 10000:
+            connection.execute(insert(Favourites), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(Favourites), batch)
+
+
+def measure(connection, size, lookups):
+    stmt = select(Favourites.id).where(
+        Favourites.user_id == db.bindparam("user_id"), Favourites.planet_id == db.bindparam("planet_id"))
+    max_planet = max(size // USERS, 1)
+    params = [{"user_id": random.randint(1, USERS), "planet_id": random.randint(1, max_planet)} for _ in range(lookups)]
+    start = time.perf_counter()
+    for p in params:
+        connection.execute(stmt, p).first()
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--without-indexes", action="store_true")
+    args = parser.parse_args()
+
+    url = os.getenv("BENCH_DATABASE_URL", "sqlite:////tmp/favourite_lookup_bench.db")
+    if url.startswith("sqlite:////") and os.path.exists(url[len("sqlite:///"):]):
+        os.remove(url[len("sqlite:///"):])
+    engine = create_engine(url)
+    table = Favourites.__table__
+    db.metadata.drop_all(engine, tables=[table])
+    db.metadata.create_all(engine, tables=[table])
+    if args.without_indexes:
+        with engine.begin() as connection:
+            for index in table.indexes:
+                index.drop(connection)
+
+    print("rows".rjust(10), "us/lookup".rjust(10))
+    rows = 0
+    for size in [int(s) for s in args.sizes.split(",")]:
+        with engine.begin() as connection:
+            fill(connection, rows, size)
+        rows = size
+        with engine.connect() as connection:
+            print(str(size).rjust(10), ("%.1f" % measure(connection, size, args.lookups)).rjust(10))
+
+
+if __name__ == "__main__":
+    main()
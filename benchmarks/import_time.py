@@ -0,0 +1,77 @@
+"""
+Cold start of a worker: time to import src/app.py and build the app with create_app(),
+each run in a fresh interpreter, for the full app and for API-only workers
+(no Flask-Admin, no swagger, no Flask-Migrate).
+
+    python benchmarks/import_time.py --runs 10
+    python benchmarks/import_time.py --profile api-only --top 15
+
+--profile runs one configuration under `python -X importtime` and lists the modules with
+the largest cumulative import time, to see what is left to trim.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+CONFIGS = {
+    "full": {"ADMIN": True, "SWAGGER": True, "MIGRATE": True},
+    "wsgi": {"ADMIN": True, "SWAGGER": True, "MIGRATE": False},
+    "api-only": {"ADMIN": False, "SWAGGER": False, "MIGRATE": False},
+}
+
+SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(json.loads(sys.argv[1]))
+built = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_ms": (built - imported) * 1000,
+                  "modules": len(sys.modules)}))
+"""
+
+
+def run(config, extra_args=()):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    env.setdefault("DATABASE_URL", "sqlite:////tmp/import_time_bench.db")
+    return subprocess.run([sys.executable, *extra_args, "-c", SCRIPT, json.dumps(config)],
+                          env=env, cwd=SRC, capture_output=True, text=True, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--profile", choices=sorted(CONFIGS))
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.profile:
+        result = run(CONFIGS[args.profile], ("-X", "importtime"))
+        rows = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            # "import time:   self_us |  cumulative_us | module"
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative_us), int(self_us), name.strip()))
+        print("%-50s %12s %10s" % ("module", "cumulative ms", "self ms"))
+        for cumulative, self_time, name in sorted(rows, reverse=True)[:args.top]:
+            print("%-50s %12.1f %10.1f" % (name, cumulative / 1000, self_time / 1000))
+        return
+
+    print("%-10s %12s %12s %12s %8s" % ("config", "import ms", "create ms", "total ms", "modules"))
+    for name, config in CONFIGS.items():
+        samples = [json.loads(run(config).stdout.splitlines()[-1]) for _ in range(args.runs)]
+        import_ms = statistics.median(s["import_ms"] for s in samples)
+        create_ms = statistics.median(s["create_ms"] for s in samples)
+        total_ms = statistics.median(s["import_ms"] + s["create_ms"] for s in samples)
+        print("%-10s %12.1f %12.1f %12.1f %8d" % (name, import_ms, create_ms, total_ms, samples[-1]["modules"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Throughput of a running server at increasing concurrency levels.
+
+    gunicorn wsgi --chdir ./src/ &              # gunicorn.conf.py: GUNICORN_WORKER_CLASS, GUNICORN_THREADS...
+    python benchmarks/load_test.py --url http://localhost:3000/planets?limit=20 --concurrency 1,4,16,64
+
+Each client is a thread with its own keep-alive connection sending requests back to back
+for --duration seconds. Only the standard library is needed.
+"""
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+
+def client(url, deadline, latencies, errors):
+    parts = urlsplit(url)
+    path = parts.path + ("?" + parts.query if parts.query else "")
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as error:
+            errors.append(error)
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def run(url, concurrency, duration):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=client, args=(url, deadline, latencies, errors)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    count = len(latencies)
+    p50 = latencies[count // 2] * 1000 if count else 0
+    p99 = latencies[min(count - 1, int(count * 0.99))] * 1000 if count else 0
+    return count / duration, p50, p99, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:3000/planets?limit=20")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64")
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print("clients".rjust(8), "req/s".rjust(10), "p50 ms".rjust(8), "p99 ms".rjust(8), "errors".rjust(7))
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        rps, p50, p99, errors = run(args.url, concurrency, args.duration)
+        print(str(concurrency).rjust(8), ("%.0f" % rps).rjust(10), ("%.1f" % p50).rjust(8), ("%.1f" % p99).rjust(8), str(errors).rjust(7))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Signups per second (password hashes per second) at different KDF work factors.
+
+    python benchmarks/password_hashing.py
+    python benchmarks/password_hashing.py --methods scrypt:16384:8:1,pbkdf2:sha256:600000 --threads 1,4,8
+
+--threads is the number of concurrent requests hashing at the same time through the
+thread pool in src/passwords.py (set its size with PASSWORD_HASH_THREADS).
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", default="scrypt:16384:8:1,scrypt:32768:8:1,scrypt:65536:8:1,pbkdf2:sha256:600000")
+    parser.add_argument("--threads", default="1,4")
+    parser.add_argument("--duration", type=float, default=3)
+    args = parser.parse_args()
+
+    thread_counts = [int(t) for t in args.threads.split(",")]
+    os.environ.setdefault("PASSWORD_HASH_THREADS", str(max(thread_counts)))
+    import passwords
+
+    print("method".ljust(24), "clients".rjust(8), "hashes/s".rjust(10), "ms/hash".rjust(8))
+    for method in args.methods.split(","):
+        for clients in thread_counts:
+            count = [0]
+            lock = threading.Lock()
+            deadline = time.perf_counter() + args.duration
+
+            def signup():
+                while time.perf_counter() < deadline:
+                    passwords.hash_password("correct horse battery staple", method)
+                    with lock:
+                        count[0] += 1
+
+            workers = [threading.Thread(target=signup) for _ in range(clients)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            rate = count[0] / elapsed
+            print(method.ljust(24), str(clients).rjust(8), ("%.1f" % rate).rjust(10), ("%.1f" % (1000 * clients / rate)).rjust(8))
+
+
+if __name__ == "__main__":
+    main()
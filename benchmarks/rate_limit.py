@@ -0,0 +1,65 @@
+"""
+Overhead of the rate limiter (src/ratelimit.py) on a write endpoint.
+
+    python benchmarks/rate_limit.py --calls 200000
+
+Reports the cost of one MemoryBackend.hit() with few and with many distinct keys, and
+of a whole request through the decorator against the same view without it, both inside
+a request context so the key lookup (client address / user_id of the body) is included.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    from flask import Flask
+    import ratelimit
+
+    calls = args.calls
+    # Limites que nunca se alcanzan: se mide el camino de una peticion permitida
+    limit = "%d/second" % (calls * 10)
+
+    backend = ratelimit.MemoryBackend()
+    count, period = ratelimit.parse_limit(limit)
+    print("%-40s %10s" % ("operation", "us/call"))
+    print("%-40s %10.2f" % ("hit(), 1 key", per_call(lambda: backend.hit("k", count, period), calls)))
+
+    keys = ["user:%d" % i for i in range(10000)]
+    state = {"i": 0}
+
+    def many_keys():
+        state["i"] = (state["i"] + 1) % len(keys)
+        backend.hit(keys[state["i"]], count, period)
+    print("%-40s %10.2f" % ("hit(), 10000 keys", per_call(many_keys, calls)))
+
+    app = Flask(__name__)
+
+    def view():
+        return "ok"
+
+    by_ip = ratelimit.rate_limit(limit)(view)
+    by_user = ratelimit.rate_limit(limit, per="user")(view)
+    with app.test_request_context("/favourite/planet/1", method="POST", json={"user_id": 1}):
+        plain = per_call(view, calls)
+        print("%-40s %10.2f" % ("view without limit", plain))
+        print("%-40s %10.2f" % ("view + per-ip limit (overhead)", per_call(by_ip, calls) - plain))
+        print("%-40s %10.2f" % ("view + per-user limit (overhead)", per_call(by_user, calls) - plain))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Cost of building a list response: ORM entities + serialize() (the old path) against
+row tuples turned into dicts (src/pagination.py), each encoded with Flask's default JSON
+provider and with orjson when it is installed.
+
+    python benchmarks/serialization.py --rows 10000
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/serialization_bench.db")
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from app import app
+    from models import db, User
+    from json_provider import OrjsonProvider, orjson
+
+    providers = [("default", DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(("orjson", OrjsonProvider(app)))
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {"email": "user%d@bench.local" % i, "password": "x", "username": "user%d" % i, "name": "Bench", "lastname": "User"}
+            for i in range(args.rows)])
+        db.session.commit()
+
+        fields = User.public_fields
+        columns = [getattr(User, field) for field in fields]
+
+        def orm_items():
+            db.session.expunge_all()
+            return [user.serialize() for user in db.session.scalars(db.select(User).order_by(User.id))]
+
+        def row_items():
+            return [dict(zip(fields, row)) for row in db.session.execute(db.select(*columns).order_by(User.id))]
+
+        assert orm_items() == row_items()
+
+        print("%-26s %10s" % ("path (%d users)" % args.rows, "best ms"))
+        for name, provider in providers:
+            print("%-26s %10.1f" % ("ORM + serialize + " + name, timed(lambda: provider.dumps({"users": orm_items()}), args.repeat)))
+            print("%-26s %10.1f" % ("rows + " + name, timed(lambda: provider.dumps({"users": row_items()}), args.repeat)))
+        items = row_items()
+        for name, provider in providers:
+            print("%-26s %10.1f" % ("encode only, " + name, timed(lambda: provider.dumps({"users": items}), args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Gunicorn settings, picked up automatically from the repo root by `gunicorn wsgi --chdir ./src/` (Procfile, render.yaml)
+#
+# GUNICORN_WORKER_CLASS=gthread (default): WEB_CONCURRENCY processes x GUNICORN_THREADS threads,
+#   no extra packages needed.
+# GUNICORN_WORKER_CLASS=gevent: green threads for many concurrent, mostly idle connections.
+#   gevent and psycogreen are in the Pipfile; psycopg2 is patched below so DB calls yield.
+#   Use it for GET /events: with gthread each open stream holds a thread (see src/events.py),
+#   and set EVENTS_BROKER_URL so every worker's streams see the writes of all of them.
+# GUNICORN_WORKER_CLASS=sync: the previous behaviour, one request per process.
+#
+# WEB_CONCURRENCY (worker processes) defaults to 2 and is not derived from the CPU count: in
+# a container that counts the host's cores, and every worker opens its own connection pool.
+# Size it so that:
+#   - DB_POOL_SIZE + DB_MAX_OVERFLOW (see src/app.py) >= the concurrent requests a worker can
+#     run (GUNICORN_THREADS with gthread);
+#   - WEB_CONCURRENCY x (DB_POOL_SIZE + DB_MAX_OVERFLOW), for every instance, stays below the
+#     Postgres max_connections (100 by default) minus what migrations and admin tools need.
+# With the defaults that is 2 x (5 + 10) = 30 connections per instance.
+import os
+
+bind = "0.0.0.0:" + os.getenv("PORT", "3000")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def worker_exit(server, worker):
+    # WRITE_BEHIND=1: apply the favourite changes still queued in this worker before it exits
+    # (src/writebehind.py). Keep WRITE_BEHIND_DRAIN_TIMEOUT below graceful_timeout.
+    import sys
+    writebehind = sys.modules.get("writebehind")
+    if writebehind is not None:
+        writebehind.drain_all()
@@ -1,16 +1,204 @@
+"""
+Flask-Admin on /admin for the five models.
+
+The stock ModelView runs a COUNT(*) over the whole table and pages with OFFSET on every
+list page, both get slower with every row. The views here:
+
+- Page by keyset: the last row of every page shown is remembered (per view, sort, search
+  and filters), so "next" continues with WHERE (sort column, id) > (last row) instead of
+  skipping rows. Jumping to a page no one has reached yet still uses OFFSET.
+- Estimate the count of an unfiltered list on PostgreSQL from pg_class.reltuples (kept by
+  ANALYZE/autovacuum) once a table has ADMIN_EXACT_COUNT_LIMIT rows. Filtered lists count
+  at most that many rows; past it the pager only shows previous/next.
+- Only offer filters and sorting on indexed columns (the filter_fields, range_fields and
+  sort_fields of each model, as in filters.py), and load the relationships shown in the
+  favourites list in the same query.
+- Run the list queries with a statement_timeout of ADMIN_STATEMENT_TIMEOUT ms on
+  PostgreSQL. With DATABASE_REPLICA_URLS they go to a replica like any GET (replicas.py).
+"""
 import os
 from flask_admin import Admin
-from models import db, User
-from flask_admin.contrib.sqla import ModelView
+from flask_admin.contrib.sqla import ModelView, filters as sqla_filters
+from flask_admin.contrib.sqla.ajax import QueryAjaxModelLoader
+from sqlalchemy import func, text, tuple_
+from wtforms.validators import ValidationError
+from cache import LRUCache, MISSING
+from favourites import FAVOURITE_TYPES, count_favourites
+from models import db, User, Characters, Vehicles, Planets, Favourites
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", 50))
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv("ADMIN_EXACT_COUNT_LIMIT", 10000))
+ADMIN_STATEMENT_TIMEOUT = int(os.getenv("ADMIN_STATEMENT_TIMEOUT", 5000))
+
+# (vista, orden, busqueda, filtros, pagina) -> clave de la ultima fila de esa pagina
+page_anchors = LRUCache(maxsize=10000, ttl=3600)
+
+
+def indexed_filters(model):
+    result = []
+    for name in getattr(model, "filter_fields", ()):
+        result.append(sqla_filters.FilterEqual(getattr(model, name), name))
+    for name in getattr(model, "range_fields", ()):
+        column = getattr(model, name)
+        result += [sqla_filters.FilterEqual(column, name), sqla_filters.FilterGreater(column, name), sqla_filters.FilterSmaller(column, name)]
+    return result
+
+
+class KeysetModelView(ModelView):
+    page_size = ADMIN_PAGE_SIZE
+    column_default_sort = ("id", True)
+    # Con otro numero de filas por pagina las claves guardadas en page_anchors no valdrian
+    can_set_page_size = False
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        if page_size is None:
+            page_size = self.page_size
+        if not execute or not page_size:
+            # Exportaciones y similares: el comportamiento de Flask-Admin
+            return super().get_list(page, sort_column, sort_desc, search, filters, execute, page_size)
+
+        self.limit_statement_time()
+        joins = {}
+        count_joins = {}
+        query = self.get_query()
+        if self._search_supported and search:
+            query, _, joins, count_joins = self._apply_search(query, None, joins, count_joins, search)
+        if filters and self._filters:
+            query, _, joins, count_joins = self._apply_filters(query, None, joins, count_joins, filters)
+        count = self.get_count(query, filtered=bool(search or filters))
+
+        for j in self._auto_joins:
+            query = query.options(db.joinedload(j))
+
+        sort_name, descending = (sort_column, sort_desc) if sort_column else self.column_default_sort
+        sort = getattr(self.model, sort_name, None)
+        if sort_name not in self.keyset_columns():
+            # Orden por una columna de una relacion: OFFSET como siempre
+            query, joins = self._apply_sorting(query, joins, sort_column, sort_desc)
+            return count, self._apply_pagination(query, page, page_size).all()
+
+        keys = [self.model.id] if sort_name == "id" else [sort, self.model.id]
+        query = query.order_by(*[key.desc() if descending else key for key in keys])
+        anchor_key = (sort_name, bool(descending), search, tuple(tuple(f) for f in filters or ()))
+        anchor = page_anchors.get(self.endpoint, anchor_key + (page - 1,)) if page else MISSING
+        if anchor is not MISSING:
+            position = tuple_(*keys) if len(keys) > 1 else keys[0]
+            query = query.filter(position < anchor if descending else position > anchor)
+        elif page:
+            query = query.offset(page * page_size)
+
+        rows = query.limit(page_size).all()
+        if len(rows) == page_size:
+            last = rows[-1]
+            value = last.id if sort_name == "id" else (getattr(last, sort_name), last.id)
+            page_anchors.set(self.endpoint, anchor_key + (page,), value)
+        return count, rows
+
+    def keyset_columns(self):
+        return ("id",) + tuple(getattr(self.model, "sort_fields", ()))
+
+    def get_count(self, query, filtered):
+        # Estimacion de PostgreSQL si la tabla es grande; si no, COUNT limitado a ADMIN_EXACT_COUNT_LIMIT
+        if not filtered and self.dialect_name() == "postgresql":
+            estimate = self.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": '"' + self.model.__table__.name + '"'}
+            ).scalar()
+            if estimate is not None and estimate >= ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        limited = query.order_by(None).limit(ADMIN_EXACT_COUNT_LIMIT + 1).subquery()
+        count = self.session.query(func.count()).select_from(limited).scalar()
+        # None: Flask-Admin muestra solo anterior/siguiente
+        return count if count <= ADMIN_EXACT_COUNT_LIMIT else None
+
+    def limit_statement_time(self):
+        if ADMIN_STATEMENT_TIMEOUT and self.dialect_name() == "postgresql":
+            # SET LOCAL: solo dura la transaccion de esta peticion
+            self.session.execute(text("SET LOCAL statement_timeout = %d" % ADMIN_STATEMENT_TIMEOUT))
+
+    def dialect_name(self):
+        return self.session.get_bind(self.model.__mapper__).dialect.name
+
+
+class UserView(KeysetModelView):
+    column_list = ("id", "email", "username", "name", "lastname", "subscription_date",
+                   "planet_favourites", "character_favourites", "vehicle_favourites")
+    column_sortable_list = ("id", "email")
+    column_filters = (sqla_filters.FilterEqual(User.email, "email"),)
+    # Los favoritos y sus contadores se gestionan desde su propia vista
+    form_excluded_columns = ("favourites", "planet_favourites", "character_favourites", "vehicle_favourites",
+                             "subscription_date")
+
+    def keyset_columns(self):
+        return ("id", "email")
+
+
+class CatalogView(KeysetModelView):
+    # name tiene indice trigram en PostgreSQL (ver filters.py)
+    column_searchable_list = ("name",)
+    form_excluded_columns = ("favourites",)
+
+    def __init__(self, model, session, **kwargs):
+        self.column_list = model.public_fields
+        self.column_sortable_list = ("id",) + model.sort_fields
+        self.column_filters = indexed_filters(model)
+        super().__init__(model, session, **kwargs)
+
+
+class LabelAjaxLoader(QueryAjaxModelLoader):
+    # Muestra el primer campo de busqueda (email, name) en lugar de "<User 11>"
+    def format(self, model):
+        if model is None:
+            return None
+        return getattr(model, self.pk), getattr(model, self.fields[0])
+
+
+class FavouriteView(KeysetModelView):
+    column_list = ("id", "user.email", "planet.name", "character.name", "vehicle.name")
+    column_sortable_list = ("id",)
+    column_filters = (sqla_filters.FilterEqual(Favourites.user_id, "user id"),)
+    # Un JOIN en la misma consulta en lugar de una consulta por fila y relacion
+    column_select_related_list = (Favourites.user, Favourites.planet, Favourites.character, Favourites.vehicle)
+    # Desplegables con busqueda en lugar de cargar todas las filas de cada tabla
+    form_ajax_refs = {
+        "user": LabelAjaxLoader("user", db.session, User, fields=("email",), page_size=10),
+        "planet": LabelAjaxLoader("planet", db.session, Planets, fields=("name",), page_size=10),
+        "character": LabelAjaxLoader("character", db.session, Characters, fields=("name",), page_size=10),
+        "vehicle": LabelAjaxLoader("vehicle", db.session, Vehicles, fields=("name",), page_size=10),
+    }
+    # Crear o borrar; cambiar el destino de un favorito descuadraria los contadores
+    can_edit = False
+
+    def on_model_change(self, form, model, is_created):
+        if is_created:
+            # Los ids de las relaciones elegidas no estan en el modelo hasta el flush
+            self.session.flush()
+            targets = favourite_targets(model)
+            if len(targets) != 1:
+                raise ValidationError("Choose one planet, character or vehicle")
+            count_favourites(model.user_id, targets, 1)
+
+    def on_model_delete(self, model):
+        count_favourites(model.user_id, favourite_targets(model), -1)
+
+
+def favourite_targets(favourite):
+    # {"planet": [3]} para un favorito de planet 3
+    targets = {}
+    for kind, (model, column) in FAVOURITE_TYPES.items():
+        target_id = getattr(favourite, column.key)
+        if target_id is not None:
+            targets[kind] = [target_id]
+    return targets
+
 
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
-    
-    # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-
-    # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(CatalogView(Characters, db.session))
+    admin.add_view(CatalogView(Vehicles, db.session))
+    admin.add_view(CatalogView(Planets, db.session))
+    admin.add_view(FavouriteView(Favourites, db.session))
@@ -2,43 +2,292 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, Blueprint, Response, request, jsonify, url_for, stream_with_context, current_app
 from flask_cors import CORS
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 from utils import APIException, generate_sitemap
-from admin import setup_admin
+from pagination import ListQuery, keyset_page, iter_rows, parse_int_arg, parse_fields, parse_ids, lookup_ids
+from seed import seed_command
+from metrics import setup_metrics, render_metrics
+from json_provider import json_provider_class
+from compression import compress_response
+from passwords import hash_password, check_and_upgrade
+from ratelimit import rate_limit
+from favourites import (parse_batch, add_favourites, remove_favourites, count_favourites,
+                        top_favourites, user_favourite_counts, favourites_cli, FAVOURITE_TYPES)
+from cache import cache, register_models, MISSING
+from conditional import CachedResponse, make_etag, not_modified, response_304, add_validators, PRIVATE_CACHE_CONTROL
+from replicas import setup_replicas, replica_status
+from idempotency import setup_idempotency
+from writebehind import setup_write_behind, queue_favourites
+from events import bus, stream, register_event_models
+from snapshots import SNAPSHOTS, snapshot_response, snapshot_file
 from models import db, User, Characters, Vehicles, Planets, Favourites
 #from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+# Tablas de catalogo que casi nunca cambian: se sirven desde la cache en memoria
+CATALOG_MODELS = (Characters, Vehicles, Planets)
+register_models(*CATALOG_MODELS)
+# Sus cambios y los de los favoritos se publican en GET /events (events.py)
+register_event_models(*CATALOG_MODELS, Favourites)
+
+# Limites de peticiones de los endpoints de escritura ("<peticiones>/<periodo>", ver ratelimit.py)
+SIGNUP_RATE_LIMIT = os.getenv("RATELIMIT_SIGNUP", "10/minute")
+FAVOURITES_RATE_LIMIT = os.getenv("RATELIMIT_FAVOURITES", "60/minute")
+FAVOURITES_IP_RATE_LIMIT = os.getenv("RATELIMIT_FAVOURITES_IP", "300/minute")
+
+api = Blueprint("api", __name__)
+
+
+def create_app(config=None):
+    """
+    Builds the app. `config` overrides the settings read from the environment.
+
+    ADMIN, SWAGGER and MIGRATE (APP_ADMIN, APP_SWAGGER, APP_MIGRATE; all on by default)
+    register Flask-Admin on /admin, the spec on /swagger.json and the `flask db` commands.
+    Their packages are only imported when they are on (flask_swagger on the first request
+    to /swagger.json), so API-only workers that turn them off start faster.
+    """
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    # orjson si esta instalado (ver json_provider.py)
+    app.json_provider_class = json_provider_class()
+    app.json = app.json_provider_class(app)
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['ADMIN'] = os.getenv("APP_ADMIN", "1") == "1"
+    app.config['SWAGGER'] = os.getenv("APP_SWAGGER", "1") == "1"
+    app.config['MIGRATE'] = os.getenv("APP_MIGRATE", "1") == "1"
+    app.config['WRITE_BEHIND'] = os.getenv("WRITE_BEHIND", "0") == "1"
+    app.config.update(config or {})
+
+    # Pool de conexiones configurable por entorno. Con gthread/gevent cada worker atiende
+    # varias peticiones a la vez, asi que DB_POOL_SIZE debe ser >= hilos por worker
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith("postgresql"):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"
+        })
+
+    # Replicas de lectura (DATABASE_REPLICA_URLS): tienen que estar en SQLALCHEMY_BINDS antes de init_app
+    setup_replicas(app, db)
+
+    if app.config['MIGRATE']:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    db.init_app(app)
+    CORS(app)
+    if app.config['ADMIN']:
+        from admin import setup_admin
+        setup_admin(app)
+    if app.config['SWAGGER']:
+        app.add_url_rule('/swagger.json', 'swagger_spec', swagger_spec)
+
+    # flask seed <planets|characters|vehicles> <fichero>
+    app.cli.add_command(seed_command)
+    # flask favourites reconcile
+    app.cli.add_command(favourites_cli)
+
+    # Latencia, consultas SQL y tiempo de serializacion por peticion (GET /metrics y cabecera Server-Timing).
+    # Se registra antes que add_validators para que mida la respuesta final (after_request va en orden inverso)
+    setup_metrics(app)
+
+    # gzip/brotli segun Accept-Encoding. Se registra antes que add_validators para ejecutarse despues
+    # (after_request va en orden inverso) y calcular el ETag sobre el cuerpo sin comprimir
+    app.after_request(compress_response)
+
+    # ETag calculado sobre el cuerpo para los GET que no ponen el suyo propio
+    app.after_request(add_validators)
+
+    # Favoritos en cola con respuesta 202 y escritura en lotes en segundo plano (writebehind.py)
+    setup_write_behind(app, app.config['WRITE_BEHIND'])
+
+    # Idempotency-Key en los POST: los reintentos reciben la respuesta guardada (idempotency.py)
+    setup_idempotency(app)
+
+    app.register_error_handler(APIException, handle_invalid_usage)
+    app.register_blueprint(api)
+    return app
+
+
+def __getattr__(name):
+    # `from app import app` (flask CLI with FLASK_APP=src/app.py, init.py, benchmarks) builds
+    # the app with the environment settings the first time it is used; importing create_app does not
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
 
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
+# Especificacion OpenAPI generada a partir de los docstrings de las rutas
+def swagger_spec():
+    from flask_swagger import swagger
+    return jsonify(swagger(current_app))
+
+# Exportacion en streaming (?stream=1 o Accept: application/x-ndjson): una fila JSON por linea
+def wants_stream():
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+def stream_entities(query):
+    # Sin ?limit= se exporta todo; con el, esas filas aunque pasen de PAGE_SIZE_MAX
+    limit = parse_int_arg(request.args, "limit", minimum=1)
+
+    def generate():
+        for item in iter_rows(query, limit):
+            yield current_app.json.dumps(item) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# ?ids=1,5,9 en los listados: las filas pedidas con una sola consulta IN, en el orden de la
+# peticion, y la lista de ids que no existen (?fields= tambien se aplica; filtros, orden,
+# busqueda y pagina no, y combinarlos con ids es un 400)
+def lookup_entities(model, key, found_msg):
+    combined = sorted(name for name in request.args if name not in ("ids", "fields") and not name.startswith("_"))
+    if combined:
+        raise APIException("ids can not be combined with " + ", ".join(combined), status_code=400)
+    ids = parse_ids(request.args["ids"])
+    fields = parse_fields(request.args, model)
+
+    def build():
+        items, missing = lookup_ids(model, ids, fields)
+        return {
+            "msg": found_msg,
+            key: items,
+            "missing": missing
+        }, 200
+
+    if model in CATALOG_MODELS:
+        return cached_response(model, ("ids",) + tuple(sorted(request.args.items())), build)
+
+    payload, status = build()
+    return jsonify(payload), status
+
+# Respuesta comun de los listados: pagina por cursor (?limit=&after=), proyeccion de columnas (?fields=),
+# filtros, orden y busqueda por nombre (?gender=...&sort=-height&q=...; ver filters.py)
+def list_entities(model, key, found_msg, not_found_msg=None):
+    if request.args.get("ids"):
+        return lookup_entities(model, key, found_msg)
+
+    query = ListQuery(model, request.args)
+    if wants_stream():
+        return stream_entities(query)
+
+    def build():
+        items, next_cursor = keyset_page(query)
+
+        if not items and query.after is None and not_found_msg:
+            return {
+                "msg": not_found_msg
+            }, 404
+
+        next_url = None
+        if next_cursor is not None:
+            next_args = request.args.to_dict()
+            next_args.update(limit=query.limit, after=next_cursor)
+            next_url = url_for(request.endpoint, **next_args)
+
+        return {
+            "msg": found_msg,
+            key: items,
+            "next_cursor": next_cursor,
+            "next": next_url
+        }, 200
+
+    if model in CATALOG_MODELS:
+        # Sin argumentos el listado se sirve desde un fichero ya escrito (snapshots.py)
+        if SNAPSHOTS and not request.args:
+            return snapshot_response(model.__tablename__, lambda: CachedResponse(*build()))
+        return cached_response(model, ("page",) + tuple(sorted(request.args.items())), build)
+
+    payload, status = build()
+    return jsonify(payload), status
+
+# Respuesta de catalogo servida desde la cache ya renderizada (cuerpo JSON + ETag).
+# build() solo se ejecuta en un fallo de cache; las respuestas 404 no se guardan
+def cached_response(model, key, build):
+    # La version se lee antes de consultar: si se confirma una escritura mientras build()
+    # se ejecuta, la entrada se guarda con la version anterior y nadie la vuelve a leer
+    version = cache.version(model.__tablename__)
+    entry = cache.get(model.__tablename__, key, version)
+    if entry is MISSING:
+        payload, status = build()
+        entry = CachedResponse(payload, status)
+        if status == 200:
+            cache.set(model.__tablename__, key, entry, version)
+    return entry.to_response()
+
 # generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
+
+# Contadores de la cache de catalogo (aciertos, fallos, expulsiones)
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(cache.stats()), 200
+
+# Cambios en planets, characters, vehicles y favoritos como Server-Sent Events, en lugar de
+# repetir los listados para ver si algo ha cambiado. ?user_id= recibe tambien los favoritos de
+# ese usuario, ?tables=planet,favourite filtra por tabla, Last-Event-ID reanuda el stream
+@api.route('/events', methods=['GET'])
+def events():
+    user_id = parse_int_arg(request.args, "user_id")
+    tables = set(filter(None, request.args.get("tables", "").split(","))) or None
+    headers = {
+        "Cache-Control": "no-cache",
+        # Que nginx y similares no acumulen el stream en un buffer
+        "X-Accel-Buffering": "no"
+    }
+    # HEAD no abre el stream ni ocupa plaza de suscriptor
+    if request.method == "HEAD":
+        return Response(mimetype="text/event-stream", headers=headers)
+    if not bus.subscribe():
+        return jsonify({"msg": "Too many subscribers, retry later"}), 503, {"Retry-After": "5"}
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    response = Response(stream(last_event_id, user_id, tables), mimetype="text/event-stream", headers=headers)
+    # La plaza se libera al cerrar la respuesta, aunque el cuerpo no llegue a recorrerse
+    response.call_on_close(bus.unsubscribe)
+    return response
+
+# Fichero de un listado de catalogo por su nombre con hash (cabecera Content-Location de
+# GET /planets, /characters y /vehicles). Su contenido no cambia nunca, se cachea 365 dias
+@api.route('/snapshots/<name>', methods=['GET'])
+def get_snapshot(name):
+    response = snapshot_file(name)
+    if response is None:
+        return jsonify({"msg": "Snapshot not found"}), 404
+    return response
+
+# Replicas de lectura configuradas y si se estan usando o estan marcadas como caidas
+@api.route('/replicas', methods=['GET'])
+def replicas():
+    return jsonify(replica_status(db.engines)), 200
+
+# Metricas en formato de texto de Prometheus
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 # Crear un nuevo usuario --> FUNCIONA
-@app.route('/user', methods=['POST'])
+@api.route('/user', methods=['POST'])
+@rate_limit(SIGNUP_RATE_LIMIT)
 def create_user():
     request_data = request.get_json()
 
@@ -54,7 +303,7 @@ def create_user():
     
     new_user = User(
         email = request_data["email"],
-        password = request_data["password"],
+        password = hash_password(request_data["password"]),
         username = request_data["username"],
         name = request_data["name"],
         lastname = request_data["lastname"]
@@ -70,141 +319,229 @@ def create_user():
     }), 201
 
 
-# Listar todos los registros de characters en la base de datos --> FUNCIONA
-@app.route('/characters', methods=['GET'])
-def get_all_characters():
+# Comprobar las credenciales de un usuario; si su hash usa un metodo o coste antiguo se rehace
+@api.route('/login', methods=['POST'])
+def login():
+    request_data = request.get_json(silent=True)
 
-    characters= Characters.query.all()
-    characters_serialize = [character.serialize() for character in characters]
+    if not request_data or not request_data.get('email') or not request_data.get('password'):
+        return jsonify({"msg": "Email and password are required"}), 400
+
+    user = User.query.filter_by(email = request_data.get('email')).first()
+    if not user or not check_and_upgrade(user, request_data["password"]):
+        return jsonify({"msg": "Invalid email or password"}), 401
+
+    if db.session.dirty:
+        db.session.commit()
 
-    if not characters:
-        return jsonify({
-            "msg": "Characters not found"
-        }), 404
-    
     return jsonify({
-        "msg": "Characters retrieved successfully",
-        "characters": characters_serialize 
+        "msg": "Login successful",
+        "user": user.serialize()
+    }), 200
+
 
-    }),200
+# Varios planets, characters y vehicles por id en una sola llamada, una consulta IN por tipo:
+# /entities?planet=1,2&character=5&vehicle=3
+@api.route('/entities', methods=['GET'])
+def get_entities():
+    data = {"msg": "Entities found", "missing": {}}
+    for kind, (model, column) in FAVOURITE_TYPES.items():
+        if not request.args.get(kind):
+            continue
+        items, missing = lookup_ids(model, parse_ids(request.args[kind], kind))
+        data[kind] = items
+        data["missing"][kind] = missing
+
+    if len(data) == 2:
+        return jsonify({"msg": "Ask for at least one of: " + ", ".join(FAVOURITE_TYPES)}), 400
+    return jsonify(data), 200
+
+# Listar todos los registros de characters en la base de datos --> FUNCIONA
+@api.route('/characters', methods=['GET'])
+def get_all_characters():
+
+    return list_entities(Characters, "characters", "Characters retrieved successfully", "Characters not found")
 
 # Obtener un personaje por su id --> FUNCIONA
-@app.route('/characters/<int:character_id>', methods=['GET'])
+@api.route('/characters/<int:character_id>', methods=['GET'])
 def get_character(character_id):
 
-    character= Characters.query.get(character_id)
+    def build():
+        character= db.session.get(Characters, character_id)
 
-    if not character:
-        return jsonify({
-            "msg": "Character not found"
-        }), 404
-    
-    return jsonify({
-        "msg": "Character found",
-        "character": character.serialize()
+        if not character:
+            return {
+                "msg": "Character not found"
+            }, 404
 
-    })
+        return {
+            "msg": "Character found",
+            "character": character.serialize()
+        }, 200
+
+    return cached_response(Characters, character_id, build)
 
 # Listar todos los registros de vehicles en la base de datos --> FUNCIONA
-@app.route('/vehicles', methods=['GET'])
+@api.route('/vehicles', methods=['GET'])
 def get_all_vehicles():
 
-    vehicles= Vehicles.query.all()
-    vehicles_serialize = [vehicle.serialize() for vehicle in vehicles]
-
-    if not vehicles:
-        return jsonify({
-            "msg": "Vehicles not found"
-        }), 404
-    
-    return jsonify({
-        "msg": "Vehicles retrieved successfully",
-        "vehicles": vehicles_serialize 
-
-    }),200
+    return list_entities(Vehicles, "vehicles", "Vehicles retrieved successfully", "Vehicles not found")
 
 # Obtener un vehiculo por su id --> FUNCIONA
-@app.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@api.route('/vehicles/<int:vehicle_id>', methods=['GET'])
 def get_vehicle(vehicle_id):
 
-    vehicle= Vehicles.query.get(vehicle_id)
+    def build():
+        vehicle= db.session.get(Vehicles, vehicle_id)
 
-    if not vehicle:
-        return jsonify({
-            "msg": "Vehicle not found"
-        }), 404
-    
-    return jsonify({
-        "msg": "Vehicle found",
-        "vehicle": vehicle.serialize()
-    })
+        if not vehicle:
+            return {
+                "msg": "Vehicle not found"
+            }, 404
 
-# Listar todos los registros de planetas en la base de datos --> FUNCIONA
-@app.route('/planets', methods=['GET'])
-def get_all_planets():
+        return {
+            "msg": "Vehicle found",
+            "vehicle": vehicle.serialize()
+        }, 200
 
-    planets= Planets.query.all()
-    planets_serialize = [planet.serialize() for planet in planets]
+    return cached_response(Vehicles, vehicle_id, build)
 
-    if not planets:
-        return jsonify({
-            "msg": "Planets not found"
-        }), 404
-    
-    return jsonify({
-        "msg": "Planets retrieved successfully",
-        "planets": planets_serialize
+# Listar todos los registros de planetas en la base de datos --> FUNCIONA
+@api.route('/planets', methods=['GET'])
+def get_all_planets():
 
-    }),200
+    return list_entities(Planets, "planets", "Planets retrieved successfully", "Planets not found")
 
 # Obtener un planeta por su id --> FUNCIONA
-@app.route('/planets/<int:planet_id>', methods=['GET'])
+@api.route('/planets/<int:planet_id>', methods=['GET'])
 def get_planet(planet_id):
 
-    planet= Planets.query.get(planet_id)
+    def build():
+        planet= db.session.get(Planets, planet_id)
 
-    if not planet:
-        return jsonify({
-            "msg": "Planet not found"
-        }), 404
-    
-    return jsonify({
-        "msg": "Planet found",
-        "planet": planet.serialize()
+        if not planet:
+            return {
+                "msg": "Planet not found"
+            }, 404
 
-    }), 200
+        return {
+            "msg": "Planet found",
+            "planet": planet.serialize()
+        }, 200
 
+    return cached_response(Planets, planet_id, build)
 
 # Listar todos los usuarios del blog --> FUNCIONA
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
 def get_all_users():
 
-    users = User.query.all()
-    users_serialize =[user.serialize() for user in users]
-
-    return  jsonify({
-        "msg": "Users successfully retrieved",
-        "users": users_serialize
-    })
+    return list_entities(User, "users", "Users successfully retrieved")
 
 
 # Listar todos los favoritos que pertenecen al usuario actual --> FUNCIONA
-@app.route('/<int:user_id>/favourites', methods=['GET'])
+@api.route('/<int:user_id>/favourites', methods=['GET'])
 def get_user_favourites(user_id):
 
-    user = User.query.get(user_id)
+    # ?expand=1 devuelve los datos del planet/vehicle/character en la misma respuesta.
+    # Se resuelve siempre con 2 consultas: el usuario y sus favoritos con las 3 entidades en JOIN
+    expand = request.args.get("expand") in ("1", "true")
+    options = []
+    if expand:
+        options = [selectinload(User.favourites).options(
+            joinedload(Favourites.planet),
+            joinedload(Favourites.vehicle),
+            joinedload(Favourites.character)
+        )]
+
+    user = db.session.get(User, user_id, options=options)
 
     if not user:
         return jsonify({"msg":"User not found"}), 404
 
-    return jsonify({
+    if expand:
+        return jsonify({
+            "msg": "Favourites found succesfully",
+            "favourites" : user.serialize_favourites(expand=True)
+        }), 200
+
+    # Los favoritos solo se crean y se borran, nunca se modifican: la lista de ids
+    # identifica el contenido y permite responder 304 sin cargar ni serializar nada
+    favourite_ids = db.session.scalars(db.select(Favourites.id).filter_by(user_id=user_id).order_by(Favourites.id)).all()
+    etag = make_etag(("favourites:" + str(user_id) + ":" + ",".join(map(str, favourite_ids))).encode())
+    matched = not_modified(etag)
+    if matched:
+        return response_304(matched)
+
+    response = jsonify({
         "msg": "Favourites found succesfully",
         "favourites" : user.serialize_favourites()
+    })
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+    return response, 200
+
+# Favoritos mas populares por tipo y, con ?user_id=, cuantos tiene ese usuario.
+# Se leen de los contadores (favourites.py), sin recorrer la tabla de favoritos
+@api.route('/favourites/stats', methods=['GET'])
+def favourites_stats():
+    limit = parse_int_arg(request.args, "limit", 10, minimum=1, maximum=100)
+    kinds = list(FAVOURITE_TYPES)
+    if request.args.get("type"):
+        if request.args["type"] not in FAVOURITE_TYPES:
+            return jsonify({"msg": "type must be one of: " + ", ".join(kinds)}), 400
+        kinds = [request.args["type"]]
+
+    data = {"msg": "Favourites stats", "top": {kind: top_favourites(kind, limit) for kind in kinds}}
+
+    user_id = parse_int_arg(request.args, "user_id")
+    if user_id is not None:
+        counts = user_favourite_counts(user_id)
+        if counts is None:
+            return jsonify({"msg": "User not found"}), 404
+        data["user"] = dict(counts, user_id=user_id)
+    return jsonify(data), 200
+
+# Estado de la cola de escritura de favoritos (WRITE_BEHIND=1)
+@api.route('/favourites/queue', methods=['GET'])
+def favourites_queue():
+    write_behind = current_app.extensions.get("write_behind")
+    return jsonify(write_behind.stats() if write_behind else {"enabled": False}), 200
+
+# Añade o elimina varios favoritos (planets, characters y vehicles mezclados) en una sola transaccion
+# Body: {"user_id": 1, "planet": [1, 2], "character": [3], "vehicle": [4]}
+@api.route('/favourites/batch', methods=['POST', 'DELETE'])
+@rate_limit(FAVOURITES_IP_RATE_LIMIT)
+@rate_limit(FAVOURITES_RATE_LIMIT, per="user")
+def favourites_batch():
+    user_id, targets = parse_batch(request.get_json(silent=True))
+
+    if request.method == 'POST':
+        if not db.session.get(User, user_id):
+            return jsonify({"msg" : "User does not exist"}), 404
+
+        queued = queue_favourites(user_id, targets, "add")
+        if queued:
+            return queued
+
+        return jsonify({
+            "msg": "Favourites processed",
+            "results": add_favourites(user_id, targets)
+        }), 200
+
+    queued = queue_favourites(user_id, targets, "remove")
+    if queued:
+        return queued
+
+    return jsonify({
+        "msg": "Favourites processed",
+        "results": remove_favourites(user_id, targets)
     }), 200
 
 # Añadir un nuevo planet favorito al usuario actual con el id = planet_id --> FUNCIONA
 # Eliminar un planet favorito con el id = planet_id. --> FUNCIONA
-@app.route('/favourite/planet/<int:planet_id>', methods=['POST', 'DELETE'])
+@api.route('/favourite/planet/<int:planet_id>', methods=['POST', 'DELETE'])
+@rate_limit(FAVOURITES_IP_RATE_LIMIT)
+@rate_limit(FAVOURITES_RATE_LIMIT, per="user")
 def favourite_planet(planet_id):
     if request.method == 'POST': 
         request_data = request.get_json()
@@ -214,11 +551,16 @@ def favourite_planet(planet_id):
 
         user = User.query.get(request_data.get("user_id"))
         planet = Planets.query.get(planet_id)
-        planet_name=planet.serialize()["name"]
-
         
         if not user:
             return jsonify({"msg" : "User does not exist"}), 404
+        if not planet:
+            return jsonify({"msg" : "Planet does not exist"}), 404
+        planet_name = planet.name
+
+        queued = queue_favourites(user.id, {"planet": [planet_id]}, "add")
+        if queued:
+            return queued
         
 
         new_favourite = Favourites(
@@ -227,7 +569,12 @@ def favourite_planet(planet_id):
         )
         
         db.session.add(new_favourite)
-        db.session.commit()
+        try:
+            count_favourites(user.id, {"planet": [planet_id]}, 1)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"msg" : "Favourite already exists"}), 409
 
         return jsonify({
             "msg" : planet_name + ' added successfully',
@@ -240,12 +587,20 @@ def favourite_planet(planet_id):
         if not request_data or not request_data.get("user_id"):
             return jsonify({"msg" : "Request incomplete"}), 400
 
+        if not Planets.query.get(planet_id):
+            return jsonify({"msg" : "Planet does not exist"}), 404
+
+        queued = queue_favourites(request_data.get("user_id"), {"planet": [planet_id]}, "remove")
+        if queued:
+            return queued
+
         favourite = Favourites.query.filter_by(user_id=request_data.get("user_id"), planet_id=planet_id).first()
 
         if not favourite:
             return jsonify({"msg" : "Not found"}), 404
     
         db.session.delete(favourite)
+        count_favourites(favourite.user_id, {"planet": [planet_id]}, -1)
         db.session.commit()
 
         return jsonify({"msg": "Favourite deleted successfully"}), 200
@@ -253,7 +608,9 @@ def favourite_planet(planet_id):
 
 # Añade un nuevo character favorito al usuario actual con el id = character_id. --> FUNCIONA
 # Elimina un character favorito con el id = character_id. --> FUNCIONA
-@app.route('/favourite/character/<int:character_id>', methods=['POST','DELETE'])
+@api.route('/favourite/character/<int:character_id>', methods=['POST','DELETE'])
+@rate_limit(FAVOURITES_IP_RATE_LIMIT)
+@rate_limit(FAVOURITES_RATE_LIMIT, per="user")
 def favourite_character(character_id):
     if request.method == 'POST':
         request_data = request.get_json()
@@ -263,11 +620,16 @@ def favourite_character(character_id):
 
         user = User.query.get(request_data.get("user_id"))
         character = Characters.query.get(character_id)
-        character_name= character.serialize()["name"]
-
     
         if not user:
             return jsonify({"msg" : "User does not exist"}), 404
+        if not character:
+            return jsonify({"msg" : "Character does not exist"}), 404
+        character_name = character.name
+
+        queued = queue_favourites(user.id, {"character": [character_id]}, "add")
+        if queued:
+            return queued
     
     
         new_favourite = Favourites(
@@ -276,7 +638,12 @@ def favourite_character(character_id):
         )
     
         db.session.add(new_favourite)
-        db.session.commit()
+        try:
+            count_favourites(user.id, {"character": [character_id]}, 1)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"msg" : "Favourite already exists"}), 409
 
         return jsonify({
             "msg" : character_name + ' added successfully',
@@ -290,19 +657,29 @@ def favourite_character(character_id):
         if not request_data or not request_data.get("user_id"):
             return jsonify({"msg" : "Request incomplete"}), 400
 
+        if not Characters.query.get(character_id):
+            return jsonify({"msg" : "Character does not exist"}), 404
+
+        queued = queue_favourites(request_data.get("user_id"), {"character": [character_id]}, "remove")
+        if queued:
+            return queued
+
         favourite = Favourites.query.filter_by(user_id=request_data.get("user_id"), character_id=character_id).first()
 
         if not favourite:
             return jsonify({"msg" : "Not found"}), 404
 
         db.session.delete(favourite)
+        count_favourites(favourite.user_id, {"character": [character_id]}, -1)
         db.session.commit()
 
         return jsonify({"msg": "Favourite deleted successfully"}), 200
 
 # Añade un nuevo vehicle favorito al usuario actual con el id = vehicle_id. --> FUNCIONA
 # Elimina un vehicle favorito con el id = vehicle_id. --> FUNCIONA
-@app.route('/favourite/vehicle/<int:vehicle_id>', methods=['POST', 'DELETE'])
+@api.route('/favourite/vehicle/<int:vehicle_id>', methods=['POST', 'DELETE'])
+@rate_limit(FAVOURITES_IP_RATE_LIMIT)
+@rate_limit(FAVOURITES_RATE_LIMIT, per="user")
 def favourite_vehicle(vehicle_id):
     if request.method == 'POST':
         request_data = request.get_json()
@@ -312,11 +689,16 @@ def favourite_vehicle(vehicle_id):
 
         user = User.query.get(request_data.get("user_id"))
         vehicle = Vehicles.query.get(vehicle_id)
-        vehicle_name=vehicle.serialize()["name"]
-
     
         if not user:
             return jsonify({"msg" : "User does not exist"}), 404
+        if not vehicle:
+            return jsonify({"msg" : "Vehicle does not exist"}), 404
+        vehicle_name = vehicle.name
+
+        queued = queue_favourites(user.id, {"vehicle": [vehicle_id]}, "add")
+        if queued:
+            return queued
     
     
         new_favourite = Favourites(
@@ -325,7 +707,12 @@ def favourite_vehicle(vehicle_id):
         )
     
         db.session.add(new_favourite)
-        db.session.commit()
+        try:
+            count_favourites(user.id, {"vehicle": [vehicle_id]}, 1)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"msg" : "Favourite already exists"}), 409
 
         return jsonify({
             "msg" : vehicle_name + ' added successfully',
@@ -338,12 +725,20 @@ def favourite_vehicle(vehicle_id):
         if not request_data or not request_data.get("user_id"):
             return jsonify({"msg" : "Request incomplete"}), 400
 
+        if not Vehicles.query.get(vehicle_id):
+            return jsonify({"msg" : "Vehicle does not exist"}), 404
+
+        queued = queue_favourites(request_data.get("user_id"), {"vehicle": [vehicle_id]}, "remove")
+        if queued:
+            return queued
+
         favourite = Favourites.query.filter_by(user_id=request_data.get("user_id"), vehicle_id=vehicle_id).first()
 
         if not favourite:
             return jsonify({"msg" : "Not found"}), 404
 
         db.session.delete(favourite)
+        count_favourites(favourite.user_id, {"vehicle": [vehicle_id]}, -1)
         db.session.commit()
 
         return jsonify({"msg": "Favourite deleted successfully"}), 200
@@ -351,4 +746,4 @@ def favourite_vehicle(vehicle_id):
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
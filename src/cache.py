@@ -0,0 +1,115 @@
+"""
+In-process read-through cache for the catalog tables (characters, vehicles, planets)
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", 1024))
+CACHE_TTL = float(os.getenv("CACHE_TTL", 300))
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded LRU cache with a TTL per entry. Keys start with (tablename, version):
+    bumping the version of a table makes every old entry of that table unreachable
+    and the LRU drops them as new ones come in, so invalidation is O(1).
+    The TTL covers writes done by other worker processes, which this one never sees.
+    """
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, tablename):
+        return self.versions.get(tablename, 0)
+
+    def bump(self, tablename):
+        with self._lock:
+            self.versions[tablename] = self.versions.get(tablename, 0) + 1
+
+    def get(self, tablename, key, version=None):
+        full_key = (tablename, self.version(tablename) if version is None else version, key)
+        with self._lock:
+            entry = self._data.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[full_key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(full_key)
+            self.hits += 1
+            return value
+
+    def set(self, tablename, key, value, version=None):
+        """
+        Pass the `version` read before the value was built from the database: a write
+        committed meanwhile has bumped the version and the value is stored where no
+        lookup will find it, instead of being served as current.
+        """
+        if self.maxsize <= 0:
+            return
+        full_key = (tablename, self.version(tablename) if version is None else version, key)
+        with self._lock:
+            self._data[full_key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(full_key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "versions": dict(self.versions)
+        }
+
+
+cache = LRUCache()
+
+
+def _invalidate(mapper, connection, target):
+    tablename = mapper.local_table.name
+    cache.bump(tablename)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("cache_dirty", set()).add(tablename)
+
+
+def _invalidate_after_commit(session):
+    # Bump again once the rows are visible, in case a concurrent read cached the
+    # old data between the flush and the commit
+    for tablename in session.info.pop("cache_dirty", ()):
+        cache.bump(tablename)
+
+
+def register_models(*models):
+    # Any insert/update/delete of a row flushed by this process invalidates its table
+    for model in models:
+        event.listen(model, "after_insert", _invalidate)
+        event.listen(model, "after_update", _invalidate)
+        event.listen(model, "after_delete", _invalidate)
+    if not event.contains(Session, "after_commit", _invalidate_after_commit):
+        event.listen(Session, "after_commit", _invalidate_after_commit)
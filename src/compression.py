@@ -0,0 +1,58 @@
+"""
+gzip / brotli response compression negotiated with Accept-Encoding.
+
+Bodies smaller than COMPRESS_MIN_SIZE bytes go out as they are. Brotli is used when the
+`brotli` package (in the Pipfile) is installed and the client accepts it. Each compressed representation
+gets its own ETag ("<etag>-gzip", "<etag>-br"), conditional.not_modified() accepts any of them.
+"""
+import os
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/html", "text/plain")
+ENCODINGS = ("br", "gzip")
+
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+        return response
+    if "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(etag + "-" + encoding, weak)
+    return response
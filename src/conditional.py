@@ -0,0 +1,104 @@
+"""
+Conditional GET support: ETag / Last-Modified validators and 304 responses
+"""
+import os
+import hashlib
+from datetime import datetime, timezone
+from flask import Response, request, jsonify
+from compression import ENCODINGS, COMPRESS_MIN_SIZE, choose_encoding, compress
+
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 60))
+
+# Catalog data is the same for every client, user data must always be revalidated
+PUBLIC_CACHE_CONTROL = "public, max-age=" + str(CATALOG_MAX_AGE) + ", must-revalidate"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """
+    Returns the ETag to send back in a 304 if the client copy is still valid, else None.
+    The client may hold the plain body or a compressed one ("<etag>-gzip", see compression.py).
+    """
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110)
+    if request.if_none_match:
+        for variant in (etag,) + tuple(etag + "-" + encoding for encoding in ENCODINGS):
+            if request.if_none_match.contains(variant):
+                return variant
+        return None
+    if last_modified is not None and request.if_modified_since is not None:
+        if last_modified.replace(microsecond=0) <= request.if_modified_since:
+            return etag
+    return None
+
+
+def response_304(etag, last_modified=None, cache_control=PRIVATE_CACHE_CONTROL):
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+class CachedResponse:
+    """
+    A JSON body rendered once, with its validators. Stored in the catalog cache so
+    a matching conditional request is answered without touching the DB or serializing.
+    Compressed copies of the body are made the first time a client asks for them and
+    kept with the entry, so a hot list is compressed once and not on every request.
+    """
+
+    def __init__(self, payload, status=200):
+        self.body = jsonify(payload).get_data()
+        self.status = status
+        self.etag = make_etag(self.body)
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.encoded = {}
+
+    def encode(self, encoding):
+        if encoding is None or len(self.body) < COMPRESS_MIN_SIZE:
+            return self.body, None
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = self.encoded[encoding] = compress(self.body, encoding)
+        return data, encoding
+
+    def to_response(self):
+        if self.status != 200:
+            return Response(self.body, status=self.status, mimetype="application/json")
+
+        matched = not_modified(self.etag, self.last_modified)
+        if matched:
+            return response_304(matched, self.last_modified, PUBLIC_CACHE_CONTROL)
+
+        data, encoding = self.encode(choose_encoding())
+        response = Response(data, status=self.status, mimetype="application/json")
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+            response.set_etag(self.etag + "-" + encoding)
+        else:
+            response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.headers["Cache-Control"] = PUBLIC_CACHE_CONTROL
+        return response
+
+
+def add_validators(response):
+    # Fallback for GET handlers that do not set their own ETag: hash the body that was
+    # already built. It does not save the serialization, but the client gets a 304
+    # with no body instead of the full payload.
+    if request.method != "GET" or response.status_code != 200:
+        return response
+    if response.is_streamed or response.get_etag()[0] is not None:
+        return response
+    response.add_etag()
+    response.headers.setdefault("Cache-Control", PRIVATE_CACHE_CONTROL)
+    matched = not_modified(response.get_etag()[0])
+    if matched:
+        return response_304(matched, cache_control=response.headers["Cache-Control"])
+    return response
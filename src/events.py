@@ -0,0 +1,304 @@
+"""
+Change feed for GET /events (Server-Sent Events).
+
+Inserts, updates and deletes of the catalog models and of favourites are collected
+while a session flushes (mapper events, plus record_change() for the bulk statements in
+favourites.py) and published when the transaction commits; a rollback drops them.
+
+Each event is rendered once and kept in a ring buffer of EVENTS_BUFFER entries that
+every subscriber reads from, so publishing costs the same with 1 or 10000 listeners.
+
+The bus is per process by default (EVENTS_BROKER_URL=memory://): a subscriber only sees
+the writes of the worker that serves its stream, so with more than one gunicorn worker
+(WEB_CONCURRENCY) set EVENTS_BROKER_URL=redis://... (the `redis` package; it defaults to
+RATELIMIT_STORAGE_URL, so a Redis used for rate limiting is picked up). Events are then
+published through Redis pub/sub with a sequence from a shared counter, and a thread in
+each process appends them to its buffer: every subscriber sees every write, and event
+ids are the same in all processes. Writes done outside the ORM session (flask seed) are
+not published either way.
+
+Subscribers block on a Condition between events: under the gevent worker class
+(GUNICORN_WORKER_CLASS=gevent, see gunicorn.conf.py) that is an idle greenlet, so
+up to 1000 open streams are accepted per process. With gthread (the default) every
+stream holds one of the GUNICORN_THREADS threads of its worker for as long as it is
+open, so only half of them can be streams (2 per worker, WEB_CONCURRENCY x 2 per
+instance, with the defaults) and the rest keep serving the API; with sync there is no
+thread to spare and /events answers 503. Use gevent for more than a handful of
+subscribers. EVENTS_MAX_SUBSCRIBERS overrides the cap.
+
+Event ids are "<token>-<sequence>". A client reconnecting with Last-Event-ID gets what
+it missed if it is still in the buffer (of the same process, with memory://); otherwise
+it gets a "reset" event and should reload what it shows.
+"""
+import os
+import json
+import uuid
+import time
+import threading
+from collections import deque
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", 1000))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15))
+EVENTS_RETRY_MS = int(os.getenv("EVENTS_RETRY_MS", 3000))
+EVENTS_BROKER_URL = os.getenv("EVENTS_BROKER_URL", os.getenv("RATELIMIT_STORAGE_URL", "memory://"))
+
+
+def default_max_subscribers():
+    # Las mismas variables que lee gunicorn.conf.py
+    worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+    if worker_class == "gevent":
+        return 1000
+    if worker_class == "gthread":
+        return int(os.getenv("GUNICORN_THREADS", 4)) // 2
+    return 0
+
+
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", default_max_subscribers()))
+
+
+def render(events):
+    # [(table, user_id, payload)] -> [(table, user_id, JSON text)], rendered once for every subscriber
+    dumps = current_app.json.dumps if has_app_context() else json.dumps
+    return [(table, user_id, dumps(payload)) for table, user_id, payload in events]
+
+
+class EventBus:
+
+    def __init__(self, size=EVENTS_BUFFER):
+        self.token = uuid.uuid4().hex[:8]
+        self.sequence = 0
+        self.subscribers = 0
+        self._buffer = deque(maxlen=size)
+        self._condition = threading.Condition()
+
+    def publish(self, events):
+        # events: [(table, user_id, payload)]
+        with self._condition:
+            self._append(self.sequence + 1, render(events))
+
+    def _append(self, first, events):
+        # Con self._condition tomado; las secuencias que ya estan en el buffer se ignoran
+        for sequence, (table, user_id, data) in enumerate(events, first):
+            if sequence <= self.sequence:
+                continue
+            text = "id: %s-%d\nevent: %s\ndata: %s\n\n" % (self.token, sequence, table, data)
+            self._buffer.append((sequence, table, user_id, text))
+            self.sequence = sequence
+        self._condition.notify_all()
+
+    def resume_from(self, last_event_id):
+        """
+        Sequence to continue after for a Last-Event-ID, or None when the events after it
+        are no longer available (another process with memory://, dropped from the buffer).
+        """
+        if not last_event_id:
+            return self.sequence
+        token, _, sequence = last_event_id.partition("-")
+        if token != self.token or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self._buffer[0][0] if self._buffer else self.sequence + 1
+        if sequence > self.sequence or sequence < oldest - 1:
+            return None
+        return sequence
+
+    def wait(self, after, timeout):
+        """Events with a sequence greater than `after`, waiting up to `timeout` seconds for one."""
+        with self._condition:
+            if self.sequence <= after:
+                self._condition.wait(timeout)
+            # Eventos perdidos: descartados del buffer, o no recibidos de Redis (SharedEventBus)
+            oldest = self._buffer[0][0] if self._buffer else self.sequence + 1
+            if after > self.sequence or oldest > after + 1:
+                return None, self.sequence
+            events = []
+            for entry in reversed(self._buffer):
+                if entry[0] <= after:
+                    break
+                events.append(entry)
+            events.reverse()
+            return events, self.sequence
+
+    def subscribe(self):
+        with self._condition:
+            if self.subscribers >= EVENTS_MAX_SUBSCRIBERS:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+
+class SharedEventBus(EventBus):
+    """
+    EventBus fed through Redis pub/sub. publish() numbers the events with a shared counter
+    and sends them to every process (one Lua script, so the order on the channel is the
+    order of the numbers); a thread per process, started by the first subscribe(), appends
+    what it receives to the local buffer. After a lost connection the thread reconnects
+    and subscribers that missed events get a "reset".
+    """
+    SCRIPT = """
+local last = redis.call('INCRBY', KEYS[1], #ARGV)
+for i, event in ipairs(ARGV) do
+  redis.call('PUBLISH', KEYS[2], (last - #ARGV + i) .. ' ' .. event)
+end
+return last
+"""
+
+    def __init__(self, client, prefix="events:", size=EVENTS_BUFFER):
+        super().__init__(size)
+        self.client = client
+        self.prefix = prefix
+        # pid del proceso con el hilo de escucha: tras un fork hay que arrancar otro
+        self._listening = None
+
+    def publish(self, events):
+        messages = [json.dumps(event) for event in render(events)]
+        self.client.eval(self.SCRIPT, 2, self.prefix + "sequence", self.prefix + "channel", *messages)
+
+    def subscribe(self):
+        self.start()
+        return super().subscribe()
+
+    def start(self):
+        with self._condition:
+            if self._listening == os.getpid():
+                return
+            pubsub = self._connect()
+            self._listening = os.getpid()
+        threading.Thread(target=self._listen, args=(pubsub,), daemon=True).start()
+
+    def _connect(self):
+        # Primero la suscripcion confirmada y despues el contador: lo publicado despues llega,
+        # lo publicado antes (secuencia <= contador) se descarta en _append
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(self.prefix + "channel")
+        message = pubsub.get_message(timeout=5)
+        if message is None or message["type"] != "subscribe":
+            pubsub.close()
+            raise ConnectionError("No confirmation for SUBSCRIBE " + self.prefix + "channel")
+        # El token cambia si Redis pierde el contador, y con el los ids de los eventos
+        self.client.set(self.prefix + "token", uuid.uuid4().hex[:8], nx=True)
+        token = self.client.get(self.prefix + "token").decode()
+        sequence = int(self.client.get(self.prefix + "sequence") or 0)
+        with self._condition:
+            if token != self.token or sequence != self.sequence:
+                # Eventos que este proceso no ha recibido: wait() devuelve un reset
+                self._buffer.clear()
+                self.token = token
+                self.sequence = sequence
+                self._condition.notify_all()
+        return pubsub
+
+    def _listen(self, pubsub):
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = self._connect()
+                for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    sequence, _, event = message["data"].decode().partition(" ")
+                    with self._condition:
+                        self._append(int(sequence), [json.loads(event)])
+            except Exception:
+                # Conexion perdida (o Redis reiniciado): se vuelve a conectar
+                pubsub = None
+                time.sleep(1)
+
+
+def create_bus(url=EVENTS_BROKER_URL):
+    if url.startswith("memory://"):
+        return EventBus()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return SharedEventBus(redis.Redis.from_url(url))
+    raise ValueError("Unsupported EVENTS_BROKER_URL: " + url)
+
+
+bus = create_bus()
+
+
+def reset_event(bus):
+    return "id: %s-%d\nevent: reset\ndata: {}\n\n" % (bus.token, bus.sequence)
+
+
+def stream(last_event_id=None, user_id=None, tables=None, heartbeat=EVENTS_HEARTBEAT):
+    """
+    SSE lines for a subscriber. Favourite events are only sent to the subscriber of that
+    user (?user_id=), catalog events to everyone; `tables` restricts the event types.
+    Call bus.subscribe() first and bus.unsubscribe() when the response is closed
+    (response.call_on_close), which also happens when the body is never iterated.
+    """
+    yield "retry: %d\n\n" % EVENTS_RETRY_MS
+    after = bus.resume_from(last_event_id)
+    if after is None:
+        yield reset_event(bus)
+        after = bus.sequence
+    while True:
+        events, latest = bus.wait(after, heartbeat)
+        if events is None:
+            # el cliente va tan lento que el buffer ya ha descartado eventos que no ha visto
+            yield reset_event(bus)
+        elif not events:
+            yield ": keepalive\n\n"
+        for sequence, table, event_user_id, text in events or ():
+            if tables and table not in tables:
+                continue
+            if event_user_id is not None and event_user_id != user_id:
+                continue
+            yield text
+        after = latest
+
+
+def record_change(session, table, op, data, user_id=None):
+    # Se publica en el commit (ver _publish); un rollback lo descarta.
+    # Los handlers guardan el user_id tal como llega ("1" o 1): stream() compara con un int
+    if user_id is not None:
+        user_id = int(user_id)
+        if "user_id" in data:
+            data["user_id"] = user_id
+    payload = {"table": table, "op": op, "data": data}
+    session.info.setdefault("events", []).append((table, user_id, payload))
+
+
+def _serialize(target):
+    return target.serialize_all() if hasattr(target, "serialize_all") else target.serialize()
+
+
+def _listener(op):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            record_change(session, mapper.local_table.name, op, _serialize(target), getattr(target, "user_id", None))
+    return listener
+
+
+_on_insert = _listener("insert")
+_on_update = _listener("update")
+_on_delete = _listener("delete")
+
+
+def _publish(session):
+    events = session.info.pop("events", None)
+    if events:
+        bus.publish(events)
+
+
+def _discard(session, previous_transaction=None):
+    session.info.pop("events", None)
+
+
+def register_event_models(*models):
+    for model in models:
+        event.listen(model, "after_insert", _on_insert)
+        event.listen(model, "after_update", _on_update)
+        event.listen(model, "after_delete", _on_delete)
+    if not event.contains(Session, "after_commit", _publish):
+        event.listen(Session, "after_commit", _publish)
+        event.listen(Session, "after_soft_rollback", _discard)
@@ -0,0 +1,268 @@
+"""
+Batch add/remove of favourites: one IN query per target type, one bulk statement, one commit.
+
+Also keeps the favourite counters (User.<kind>_favourites and FavouriteCounts) in step with
+the rows: every handler that creates or deletes favourites calls count_favourites() in the
+same transaction. Rows changed elsewhere (the admin, deleting a user) are not counted;
+`flask favourites reconcile` rebuilds the counters from the favourite table.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, update, delete, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Favourites, FavouriteCounts, Planets, Characters, Vehicles
+from utils import APIException
+from pagination import MAX_PAGE_SIZE
+from events import record_change
+
+# Mayor valor de una columna INTEGER en PostgreSQL; un id mayor no puede existir
+MAX_ID = 2 ** 31 - 1
+
+# tipo de favorito -> (modelo, columna en favourite)
+FAVOURITE_TYPES = {
+    "planet": (Planets, Favourites.planet_id),
+    "character": (Characters, Favourites.character_id),
+    "vehicle": (Vehicles, Favourites.vehicle_id),
+}
+
+
+def parse_batch(request_data):
+    """
+    {"user_id": 1, "planet": [1, 2], "character": [3], "vehicle": []}
+    -> (user_id, {"planet": [1, 2], "character": [3]}) with repeated ids removed
+    """
+    if not request_data or not request_data.get("user_id"):
+        raise APIException("Request incomplete", status_code=400)
+    user_id = request_data["user_id"]
+    # "1", 1.5 o true llegarian tal cual a la consulta (DataError en PostgreSQL)
+    if not isinstance(user_id, int) or isinstance(user_id, bool) or not 1 <= user_id <= MAX_ID:
+        raise APIException("user_id must be an id between 1 and " + str(MAX_ID), status_code=400)
+
+    targets = {}
+    for kind in FAVOURITE_TYPES:
+        ids = request_data.get(kind) or []
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise APIException(kind + " must be a list of ids", status_code=400)
+        if not all(1 <= i <= MAX_ID for i in ids):
+            raise APIException(kind + " ids must be between 1 and " + str(MAX_ID), status_code=400)
+        if ids:
+            targets[kind] = list(dict.fromkeys(ids))
+
+    if not targets:
+        raise APIException("Nothing to do", status_code=400)
+    # El mismo limite que ?ids=: acota los IN, los INSERT de varias filas y lo que un
+    # lote ocupa de la cola de write-behind
+    if sum(len(ids) for ids in targets.values()) > MAX_PAGE_SIZE:
+        raise APIException("At most " + str(MAX_PAGE_SIZE) + " ids per request", status_code=400)
+    return user_id, targets
+
+
+def existing_targets(model, ids):
+    return set(db.session.scalars(db.select(model.id).where(model.id.in_(ids))))
+
+
+def existing_favourites(user_id, targets):
+    # (kind, id) de los favoritos que el usuario ya tiene, en una sola consulta
+    conditions = [FAVOURITE_TYPES[kind][1].in_(ids) for kind, ids in targets.items()]
+    stmt = db.select(Favourites.planet_id, Favourites.character_id, Favourites.vehicle_id).where(
+        Favourites.user_id == user_id, or_(*conditions))
+    found = set()
+    for planet_id, character_id, vehicle_id in db.session.execute(stmt):
+        if planet_id is not None:
+            found.add(("planet", planet_id))
+        if character_id is not None:
+            found.add(("character", character_id))
+        if vehicle_id is not None:
+            found.add(("vehicle", vehicle_id))
+    return found
+
+
+def stage_add_favourites(user_id, targets):
+    """
+    Inserts every valid, not yet favourited target with a single INSERT, without committing.
+    Returns one result per requested target: created / exists / not_found.
+    """
+    already = existing_favourites(user_id, targets)
+    results = []
+    rows = []
+    created = {}
+    for kind, ids in targets.items():
+        model, column = FAVOURITE_TYPES[kind]
+        valid = existing_targets(model, ids)
+        for target_id in ids:
+            if target_id not in valid:
+                status = "not_found"
+            elif (kind, target_id) in already:
+                status = "exists"
+            else:
+                status = "created"
+                rows.append({"user_id": user_id, column.key: target_id})
+                created.setdefault(kind, []).append(target_id)
+            results.append({"type": kind, "id": target_id, "status": status})
+
+    if rows:
+        db.session.execute(insert(Favourites), rows)
+        count_favourites(user_id, created, 1)
+        # los INSERT en bloque no pasan por los eventos del mapper
+        for row in rows:
+            record_change(db.session, Favourites.__tablename__, "insert", dict(row, user_id=int(user_id)), user_id)
+    return results
+
+
+def add_favourites(user_id, targets):
+    """
+    stage_add_favourites() and a single commit.
+    Repeating the same batch is harmless, the second time everything is "exists".
+    """
+    try:
+        results = stage_add_favourites(user_id, targets)
+        db.session.commit()
+    except IntegrityError:
+        # otra peticion ha creado alguno de estos favoritos a la vez; el cliente puede repetir el lote
+        db.session.rollback()
+        raise APIException("Favourites changed concurrently, retry the batch", status_code=409)
+    return results
+
+
+def stage_remove_favourites(user_id, targets):
+    """
+    Deletes the requested favourites of the user with a single DELETE, without committing.
+    Returns one result per requested target: deleted / not_found.
+    """
+    already = existing_favourites(user_id, targets)
+    results = [
+        {"type": kind, "id": target_id, "status": "deleted" if (kind, target_id) in already else "not_found"}
+        for kind, ids in targets.items() for target_id in ids
+    ]
+
+    if already:
+        conditions = [FAVOURITE_TYPES[kind][1].in_(ids) for kind, ids in targets.items()]
+        db.session.execute(delete(Favourites).where(Favourites.user_id == user_id, or_(*conditions)))
+        deleted = {}
+        for kind, target_id in already:
+            deleted.setdefault(kind, []).append(target_id)
+            record_change(db.session, Favourites.__tablename__, "delete",
+                          {"user_id": int(user_id), FAVOURITE_TYPES[kind][1].key: target_id}, user_id)
+        count_favourites(user_id, deleted, -1)
+    return results
+
+
+def remove_favourites(user_id, targets):
+    results = stage_remove_favourites(user_id, targets)
+    db.session.commit()
+    return results
+
+
+def counter_upsert(dialect_name):
+    table = FavouriteCounts.__table__
+    if dialect_name in ("postgresql", "sqlite"):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        return stmt.on_conflict_do_update(index_elements=["kind", "target_id"],
+                                          set_={"count": table.c.count + stmt.excluded.count})
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        return stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted.count)
+    return None
+
+
+def count_favourites(user_id, targets, delta):
+    """
+    Adds `delta` (1 or -1) to the counters of every target in {"planet": [ids], ...}
+    and to the per-type counters of the user. Runs in the caller's transaction,
+    which commits (or rolls back) the counters together with the favourites.
+    """
+    targets = {kind: ids for kind, ids in targets.items() if ids}
+    if not targets:
+        return
+
+    # Un solo UPDATE del usuario para todos los tipos
+    values = {}
+    for kind, ids in targets.items():
+        column = getattr(User, kind + "_favourites")
+        values[column.key] = column + delta * len(ids)
+    db.session.execute(update(User).where(User.id == user_id).values(**values))
+
+    rows = [{"kind": kind, "target_id": target_id, "count": delta} for kind, ids in targets.items() for target_id in ids]
+    stmt = counter_upsert(db.session.get_bind().dialect.name)
+    if stmt is not None:
+        db.session.execute(stmt, rows)
+        return
+    # dialectos sin upsert: se suma a los contadores que existen y se crean los demas
+    table = FavouriteCounts.__table__
+    for row in rows:
+        result = db.session.execute(table.update().where(
+            table.c.kind == row["kind"], table.c.target_id == row["target_id"]).values(count=table.c.count + delta))
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(**row))
+
+
+def top_favourites(kind, limit):
+    # Lee las primeras `limit` entradas del indice (kind, count, target_id), sin recorrer la tabla
+    model = FAVOURITE_TYPES[kind][0]
+    stmt = (db.select(model.id, model.name, FavouriteCounts.count)
+            .join(model, model.id == FavouriteCounts.target_id)
+            .where(FavouriteCounts.kind == kind, FavouriteCounts.count > 0)
+            .order_by(FavouriteCounts.count.desc(), FavouriteCounts.target_id.desc())
+            .limit(limit))
+    return [{"id": target_id, "name": name, "favourites": count} for target_id, name, count in db.session.execute(stmt)]
+
+
+def user_favourite_counts(user_id):
+    columns = [getattr(User, kind + "_favourites") for kind in FAVOURITE_TYPES]
+    row = db.session.execute(db.select(*columns).where(User.id == user_id)).first()
+    if row is None:
+        return None
+    counts = dict(zip(FAVOURITE_TYPES, row))
+    counts["total"] = sum(row)
+    return counts
+
+
+def reconcile_counts():
+    """
+    Rebuilds every counter from the favourite table in one transaction. Each favourite
+    points at exactly one planet/character/vehicle, so one GROUP BY over the table
+    gives all the entity counters and another one the per-user counters.
+    Returns (entity counters written, users updated).
+    """
+    per_target = db.session.execute(
+        db.select(Favourites.planet_id, Favourites.character_id, Favourites.vehicle_id, db.func.count())
+        .group_by(Favourites.planet_id, Favourites.character_id, Favourites.vehicle_id)).all()
+    counter_rows = []
+    for planet_id, character_id, vehicle_id, count in per_target:
+        for kind, target_id in (("planet", planet_id), ("character", character_id), ("vehicle", vehicle_id)):
+            if target_id is not None:
+                counter_rows.append({"kind": kind, "target_id": target_id, "count": count})
+
+    per_user = db.session.execute(
+        db.select(Favourites.user_id, db.func.count(Favourites.planet_id),
+                  db.func.count(Favourites.character_id), db.func.count(Favourites.vehicle_id))
+        .group_by(Favourites.user_id)).all()
+
+    db.session.execute(delete(FavouriteCounts))
+    if counter_rows:
+        db.session.execute(insert(FavouriteCounts), counter_rows)
+    db.session.execute(update(User).values(planet_favourites=0, character_favourites=0, vehicle_favourites=0))
+    if per_user:
+        db.session.execute(update(User), [
+            {"id": user_id, "planet_favourites": planets, "character_favourites": characters, "vehicle_favourites": vehicles}
+            for user_id, planets, characters, vehicles in per_user])
+    db.session.commit()
+    return len(counter_rows), len(per_user)
+
+
+@click.group("favourites")
+def favourites_cli():
+    """Maintenance of the favourite counters."""
+
+
+@favourites_cli.command("reconcile")
+@with_appcontext
+def reconcile_command():
+    """Rebuild the favourite counters from the favourite table."""
+    counters, users = reconcile_counts()
+    click.echo("Done: %d entity counters, %d users with favourites" % (counters, users))
@@ -0,0 +1,86 @@
+"""
+Server-side filters, sorting and name search for the catalog list endpoints
+
+    /planets?climate=arid&population_min=1000&sort=-population
+    /characters?gender=female&q=leia
+    /vehicles?manufacturer=Incom%20Corporation&crew_max=2
+
+Every filter and sort column has an index in models.py (see filter_fields, range_fields
+and sort_fields on each model). ?q= uses the trigram index on PostgreSQL, the FTS5
+trigram table on SQLite and a plain LIKE anywhere else.
+"""
+from sqlalchemy import Integer, text
+from models import db
+from utils import APIException
+
+RESERVED_ARGS = ("limit", "after", "fields", "stream", "sort", "q", "ids")
+
+_fts_tables = {}
+
+
+def _cast(column, name, value):
+    if isinstance(column.type, Integer):
+        try:
+            return int(value)
+        except ValueError:
+            raise APIException(name + " must be an integer", status_code=400)
+    return value
+
+
+def parse_filters(args, model):
+    """Equality (?gender=male) and range (?population_min=1&population_max=9) filters as WHERE clauses"""
+    filter_fields = getattr(model, "filter_fields", ())
+    range_fields = getattr(model, "range_fields", ())
+    where = []
+    for name, value in args.items():
+        # _xxx: cache busters and the like, never a filter
+        if name in RESERVED_ARGS or name.startswith("_"):
+            continue
+        if name in filter_fields:
+            column = getattr(model, name)
+            where.append(column == _cast(column, name, value))
+        elif name.endswith(("_min", "_max")) and name[:-4] in range_fields:
+            column = getattr(model, name[:-4])
+            value = _cast(column, name, value)
+            where.append(column >= value if name.endswith("_min") else column <= value)
+        else:
+            raise APIException("Unknown filter: " + name, status_code=400)
+
+    q = args.get("q", "").strip()
+    if q:
+        where.append(search_clause(model, q))
+    return where
+
+
+def parse_sort(args, model):
+    # ?sort=population / ?sort=-population -> ("population", descending)
+    value = args.get("sort", "").strip()
+    if not value or value in ("id", "-id"):
+        return "id", value == "-id"
+    descending = value.startswith("-")
+    field = value.lstrip("-")
+    if field not in getattr(model, "sort_fields", ()):
+        raise APIException("Cannot sort by: " + field, status_code=400)
+    return field, descending
+
+
+def has_fts(model):
+    tablename = model.__tablename__
+    if tablename not in _fts_tables:
+        found = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": tablename + "_fts"}).first()
+        _fts_tables[tablename] = found is not None
+    return _fts_tables[tablename]
+
+
+def search_clause(model, q):
+    dialect_name = db.engine.dialect.name
+    # the trigram tokenizer needs at least 3 characters to use the index
+    if dialect_name == "sqlite" and len(q) >= 3 and has_fts(model):
+        fts = model.__tablename__ + "_fts"
+        matches = text('SELECT rowid FROM "' + fts + '" WHERE "' + fts + '" MATCH :q').bindparams(
+            q='"' + q.replace('"', '""') + '"').columns(rowid=Integer)
+        return model.id.in_(matches)
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return model.name.ilike("%" + escaped + "%", escape="\\")
@@ -0,0 +1,103 @@
+"""
+Idempotency-Key support for POST requests.
+
+A client that sends `Idempotency-Key: <unique value>` with a POST and retries it (after a
+timeout, a dropped connection...) gets the response of the first attempt replayed, with
+`Idempotent-Replayed: true`, without running the handler or touching the database again.
+
+- Responses are kept in memory for IDEMPOTENCY_TTL seconds, at most IDEMPOTENCY_MAXSIZE
+  of them (LRU). Each worker process has its own store: a retry that lands on another
+  worker runs the handler, which the unique indexes still protect from duplicates.
+- The key is bound to the path and the body: reusing it for a different request is a 422.
+- A retry that arrives while the first attempt is still running gets a 409.
+- 5xx and 429 responses are not stored, the client can retry them with the same key.
+"""
+import os
+import hashlib
+import threading
+from flask import Response, request, jsonify, g
+from cache import LRUCache, MISSING
+
+IDEMPOTENCY_MAXSIZE = int(os.getenv("IDEMPOTENCY_MAXSIZE", 10000))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+store = LRUCache(IDEMPOTENCY_MAXSIZE, IDEMPOTENCY_TTL)
+_in_flight = set()
+_lock = threading.Lock()
+
+
+class StoredResponse:
+
+    def __init__(self, fingerprint, response):
+        self.fingerprint = fingerprint
+        self.status = response.status_code
+        self.body = response.get_data()
+        self.mimetype = response.mimetype
+        self.location = response.headers.get("Location")
+
+    def to_response(self):
+        response = Response(self.body, status=self.status, mimetype=self.mimetype)
+        if self.location:
+            response.headers["Location"] = self.location
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+
+def _error(message, status):
+    response = jsonify({"msg": message})
+    response.status_code = status
+    return response
+
+
+def replay_or_reserve():
+    if request.method != "POST":
+        return None
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return _error(IDEMPOTENCY_HEADER + " must be 1 to " + str(MAX_KEY_LENGTH) + " characters", 400)
+
+    store_key = (request.path, key)
+    fingerprint = hashlib.sha1(request.get_data()).hexdigest()
+    with _lock:
+        # The first attempt stores its response before leaving _in_flight (remember, then
+        # release), so checking both under the lock never runs the handler twice
+        stored = store.get("idempotency", store_key)
+        if stored is MISSING and store_key in _in_flight:
+            return _error("A request with this " + IDEMPOTENCY_HEADER + " is still in progress", 409)
+        if stored is MISSING:
+            _in_flight.add(store_key)
+    if stored is not MISSING:
+        if stored.fingerprint != fingerprint:
+            return _error(IDEMPOTENCY_HEADER + " was already used with a different request", 422)
+        return stored.to_response()
+    g.idempotency = (store_key, fingerprint)
+    return None
+
+
+def remember(response):
+    reserved = g.get("idempotency")
+    if reserved is None:
+        return response
+    store_key, fingerprint = reserved
+    if response.status_code < 500 and response.status_code != 429 and not response.is_streamed:
+        store.set("idempotency", store_key, StoredResponse(fingerprint, response))
+    return response
+
+
+def release(exc=None):
+    reserved = g.pop("idempotency", None)
+    if reserved is not None:
+        with _lock:
+            _in_flight.discard(reserved[0])
+
+
+def setup_idempotency(app):
+    # Register it after the other after_request hooks: those run in reverse order, so
+    # remember() sees the response before it is compressed
+    app.before_request(replay_or_reserve)
+    app.after_request(remember)
+    app.teardown_request(release)
@@ -0,0 +1,53 @@
+"""
+Pluggable JSON provider for the app. With orjson installed (it is in the Pipfile)
+responses are encoded by it; otherwise Flask's default provider is used.
+
+JSON_PROVIDER=orjson|default picks one explicitly. Both produce the same bodies: sorted
+keys, compact separators, dates as HTTP dates (as Flask does) and non-ASCII text as UTF-8
+(orjson can not escape it, so the default provider does not either), so ETags and
+clients do not change when switching. Only Flask's indented output in debug mode differs.
+"""
+import os
+import uuid
+import decimal
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    raise TypeError("Object of type " + type(o).__name__ + " is not JSON serializable")
+
+
+class UTF8JSONProvider(DefaultJSONProvider):
+    # "Bespín" como orjson, en UTF-8 y no como "Besp\u00edn"
+    ensure_ascii = False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # dumps() options from Flask (indent, separators...) are ignored: the output is always compact
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(obj, default=_default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def json_provider_class():
+    name = os.getenv("JSON_PROVIDER", "orjson" if orjson is not None else "default")
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("JSON_PROVIDER=orjson but orjson is not installed")
+        return OrjsonProvider
+    return UTF8JSONProvider
@@ -0,0 +1,130 @@
+"""
+Per-request performance instrumentation: latency, SQL queries and DB time, JSON
+serialization time and response size per endpoint.
+
+Exposed in Prometheus text format by GET /metrics and, for every response, in a
+Server-Timing header that browsers show in the network tab. Numbers are per worker
+process: with several gunicorn workers each one reports its own.
+"""
+import time
+import threading
+from bisect import bisect_left
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                # one slot per bucket plus +Inf, then the sum
+                counts = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = ["# HELP " + self.name + " " + self.help_text, "# TYPE " + self.name + " histogram"]
+        with self._lock:
+            series = {labels: list(counts) for labels, counts in self.series.items()}
+        for labels, counts in sorted(series.items()):
+            label_text = ",".join(key + '="' + str(value).replace('"', '\\"') + '"' for key, value in labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += count
+                lines.append(self.name + "_bucket{" + label_text + ',le="' + str(bound) + '"} ' + str(cumulative))
+            lines.append(self.name + "_sum{" + label_text + "} " + repr(counts[-1]))
+            lines.append(self.name + "_count{" + label_text + "} " + str(cumulative))
+        return "\n".join(lines)
+
+
+request_duration = Histogram("http_request_duration_seconds", "Request latency", LATENCY_BUCKETS)
+db_duration = Histogram("http_request_db_seconds", "Time spent in SQL per request", LATENCY_BUCKETS)
+db_queries = Histogram("http_request_db_queries", "SQL statements per request", QUERY_BUCKETS)
+serialize_duration = Histogram("http_request_serialize_seconds", "JSON encoding time per request", LATENCY_BUCKETS)
+response_size = Histogram("http_response_size_bytes", "Response body size", SIZE_BUCKETS)
+
+HISTOGRAMS = (request_duration, db_duration, db_queries, serialize_duration, response_size)
+
+
+class TimedJSONMixin:
+    """Mixed into the app's JSON provider: adds the time spent in dumps() to the current request"""
+
+    def dumps(self, obj, **kwargs):
+        if not has_request_context():
+            return super().dumps(obj, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            g.metrics_serialize = g.get("metrics_serialize", 0.0) + time.perf_counter() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # En el contexto de ejecucion de la sentencia y no en la conexion: si la sentencia
+    # falla no se llama a _after_cursor_execute y el contexto se descarta con ella
+    if context is not None and has_request_context():
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is not None and has_request_context():
+        g.metrics_db_time = g.get("metrics_db_time", 0.0) + time.perf_counter() - start
+        g.metrics_db_queries = g.get("metrics_db_queries", 0) + 1
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _record(response):
+    start = g.get("metrics_start")
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    queries = g.get("metrics_db_queries", 0)
+    db_time = g.get("metrics_db_time", 0.0)
+    serialize_time = g.get("metrics_serialize", 0.0)
+
+    endpoint = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    labels = (("endpoint", endpoint), ("method", request.method), ("status", str(response.status_code)))
+    request_duration.observe(labels, total)
+    db_duration.observe(labels, db_time)
+    db_queries.observe(labels, queries)
+    serialize_duration.observe(labels, serialize_time)
+    if not response.is_streamed:
+        response_size.observe(labels, response.calculate_content_length() or 0)
+
+    response.headers.add("Server-Timing", "db;dur=%.2f;desc=\"%d queries\"" % (db_time * 1000, queries))
+    response.headers.add("Server-Timing", "serialize;dur=%.2f" % (serialize_time * 1000))
+    response.headers.add("Server-Timing", "total;dur=%.2f" % (total * 1000))
+    return response
+
+
+def render_metrics():
+    return "\n".join(histogram.render() for histogram in HISTOGRAMS) + "\n"
+
+
+def setup_metrics(app):
+    provider_class = type("Timed" + app.json_provider_class.__name__, (TimedJSONMixin, app.json_provider_class), {})
+    app.json_provider_class = provider_class
+    app.json = provider_class(app)
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
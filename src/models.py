@@ -2,8 +2,10 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import String, DateTime, ForeignKey, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession manda las lecturas de los GET a las replicas, si hay (replicas.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
     __tablename__="user" 
@@ -15,8 +17,15 @@ class User(db.Model):
     name: Mapped[str] = mapped_column(String(50), nullable= False)
     lastname: Mapped[str] = mapped_column(String(50), nullable= False)
     subscription_date: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    # Contadores de favoritos por tipo, mantenidos por favourites.py al crear/borrar
+    planet_favourites: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    character_favourites: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    vehicle_favourites: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
 
     favourites=relationship("Favourites", back_populates="user", cascade = "all, delete-orphan")
+
+    # Columns clients may request with ?fields= (password is never exposed)
+    public_fields = ("id", "email", "username", "name", "lastname", "subscription_date")
     
     def serialize(self):
         return {
@@ -29,15 +38,25 @@ class User(db.Model):
         }
     
     
-    def serialize_favourites(self):
+    def serialize_favourites(self, expand=False):
+        if expand:
+            favourites = [favourite.serialize_expanded() for favourite in self.favourites]
+        else:
+            favourites = [favourite.serialize_all() for favourite in self.favourites]
         return {
             "user_id": self.id,
-            "favourites": [favourite.serialize_all() for favourite in self.favourites]
+            "favourites": favourites
         }
     
 
 class Characters(db.Model):
     __tablename__="character" 
+    # Indices (columna, id) para los filtros/orden de los listados (filters.py)
+    __table_args__ = (
+        db.Index("ix_character_gender_id", "gender", "id"),
+        db.Index("ix_character_eye_color_id", "eye_color", "id"),
+        db.Index("ix_character_height_id", "height", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(nullable= False, unique=True)
@@ -46,6 +65,11 @@ class Characters(db.Model):
     height: Mapped[int]
     eye_color: Mapped[str]
 
+    public_fields = ("id", "name", "gender", "birth_year", "height", "eye_color")
+    filter_fields = ("gender", "eye_color")
+    range_fields = ("height",)
+    sort_fields = ("name", "height")
+
     def serialize(self):
         return {
             "id": self.id,
@@ -60,6 +84,11 @@ class Characters(db.Model):
     
 class Vehicles (db.Model):
     __tablename__="vehicle" 
+    __table_args__ = (
+        db.Index("ix_vehicle_manufacturer_id", "manufacturer", "id"),
+        db.Index("ix_vehicle_crew_id", "crew", "id"),
+        db.Index("ix_vehicle_cargo_capacity_id", "cargo_capacity", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(nullable= False, unique=True)
@@ -67,6 +96,10 @@ class Vehicles (db.Model):
     cargo_capacity: Mapped[int]
     manufacturer: Mapped[str] = mapped_column(String(50))
 
+    public_fields = ("id", "name", "crew", "cargo_capacity", "manufacturer")
+    filter_fields = ("manufacturer",)
+    range_fields = ("crew", "cargo_capacity")
+    sort_fields = ("name", "crew", "cargo_capacity")
 
     def serialize(self):
         return {
@@ -81,6 +114,11 @@ class Vehicles (db.Model):
 
 class Planets (db.Model):
     __tablename__="planet" 
+    __table_args__ = (
+        db.Index("ix_planet_climate_id", "climate", "id"),
+        db.Index("ix_planet_diameter_id", "diameter", "id"),
+        db.Index("ix_planet_population_id", "population", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(nullable= False, unique=True)
@@ -88,6 +126,10 @@ class Planets (db.Model):
     diameter: Mapped[int]
     population: Mapped[int] 
 
+    public_fields = ("id", "name", "climate", "diameter", "population")
+    filter_fields = ("climate",)
+    range_fields = ("diameter", "population")
+    sort_fields = ("name", "diameter", "population")
 
     def serialize(self):
         return {
@@ -100,8 +142,32 @@ class Planets (db.Model):
     
     favourites=relationship("Favourites", back_populates="planet")
 
+class FavouriteCounts (db.Model):
+    __tablename__="favourite_count"
+    # Numero de usuarios que tienen cada planet/character/vehicle como favorito.
+    # El indice (kind, count, target_id) sirve el top-N sin ordenar toda la tabla
+    __table_args__ = (
+        db.Index("ix_favourite_count_kind_count", "kind", "count", "target_id"),
+    )
+
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    target_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
 class Favourites (db.Model):
     __tablename__="favourite" 
+    # Un indice unico parcial por cada par (user_id, entidad): sirve para los DELETE con
+    # filter_by(user_id=..., planet_id=...) y evita favoritos duplicados
+    __table_args__ = (
+        db.Index("ix_favourite_user_id", "user_id"),
+        db.Index("uq_favourite_user_planet", "user_id", "planet_id", unique=True,
+                 postgresql_where=db.text("planet_id IS NOT NULL"), sqlite_where=db.text("planet_id IS NOT NULL")),
+        db.Index("uq_favourite_user_vehicle", "user_id", "vehicle_id", unique=True,
+                 postgresql_where=db.text("vehicle_id IS NOT NULL"), sqlite_where=db.text("vehicle_id IS NOT NULL")),
+        db.Index("uq_favourite_user_character", "user_id", "character_id", unique=True,
+                 postgresql_where=db.text("character_id IS NOT NULL"), sqlite_where=db.text("character_id IS NOT NULL")),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(db.ForeignKey("user.id"), nullable=False)
     planet_id: Mapped[int] = mapped_column(db.ForeignKey("planet.id"), nullable=True)
@@ -116,6 +182,15 @@ class Favourites (db.Model):
             "vehicle_id": self.vehicle_id,
             "character_id": self.character_id,
         }
+
+    # Igual que serialize_all pero con los datos de la entidad referenciada; cargar
+    # planet/vehicle/character con joinedload antes de llamarlo para evitar N+1
+    def serialize_expanded(self):
+        data = self.serialize_all()
+        data["planet"] = self.planet.serialize() if self.planet else None
+        data["vehicle"] = self.vehicle.serialize() if self.vehicle else None
+        data["character"] = self.character.serialize() if self.character else None
+        return data
     
 
     user=relationship("User", back_populates="favourites")
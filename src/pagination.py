@@ -0,0 +1,167 @@
+"""
+Keyset (cursor) pagination and column projection for the list endpoints
+"""
+import os
+import json
+import base64
+from sqlalchemy import tuple_
+from models import db
+from utils import APIException
+from filters import parse_filters, parse_sort
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", 100))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", 1000))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+
+
+def parse_int_arg(args, name, default=None, minimum=None, maximum=None):
+    value = args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise APIException(name + " must be an integer", status_code=400)
+    if minimum is not None and value < minimum:
+        raise APIException(name + " must be >= " + str(minimum), status_code=400)
+    if maximum is not None and value > maximum:
+        value = maximum
+    return value
+
+
+def parse_fields(args, model, required=("id",)):
+    # ?fields=name,gender -> ["id", "name", "gender"]; the id (and the sort column) are always kept because they are the cursor
+    value = args.get("fields")
+    if not value:
+        return None
+    fields = list(dict.fromkeys(required))
+    for field in value.split(","):
+        field = field.strip()
+        if not field or field in fields:
+            continue
+        if field not in model.public_fields:
+            raise APIException("Unknown field: " + field, status_code=400)
+        fields.append(field)
+    return fields
+
+
+def parse_ids(value, name="ids"):
+    # "1,5,9,5" -> [1, 5, 9]: repeated ids removed, request order kept
+    ids = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            ids.append(int(part))
+        except ValueError:
+            raise APIException(name + " must be a comma separated list of ids", status_code=400)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_PAGE_SIZE:
+        raise APIException("At most " + str(MAX_PAGE_SIZE) + " " + name + " per request", status_code=400)
+    return ids
+
+
+def lookup_ids(model, ids, fields=None):
+    """
+    Fetches the rows with the given ids with a single IN query. Returns (items, missing):
+    the items follow the order of `ids` and `missing` lists the ids that do not exist.
+    """
+    fields = fields or list(model.public_fields)
+    found = {}
+    if ids:
+        stmt = db.select(*[getattr(model, field) for field in fields]).where(model.id.in_(ids))
+        for row in db.session.execute(stmt):
+            item = dict(zip(fields, row))
+            found[item["id"]] = item
+    return [found[i] for i in ids if i in found], [i for i in ids if i not in found]
+
+
+def encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise APIException("Invalid cursor", status_code=400)
+
+
+class ListQuery:
+    """
+    What a list request asks for: filters, sort column, page size, cursor and columns.
+    With the default order (by id) the cursor is the last id; when sorting by another
+    column it is an opaque token holding (value, id) of the last row.
+    """
+
+    def __init__(self, model, args):
+        self.model = model
+        self.limit = parse_int_arg(args, "limit", DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+        self.where = parse_filters(args, model)
+        self.sort, self.descending = parse_sort(args, model)
+        # sin ?fields= se seleccionan igualmente las columnas publicas: las filas se convierten
+        # directamente en dicts, sin crear entidades del ORM ni llamar a serialize()
+        self.fields = parse_fields(args, model, required=("id", self.sort)) or list(model.public_fields)
+        if self.sort == "id":
+            self.after = parse_int_arg(args, "after")
+        else:
+            self.after = decode_cursor(args["after"]) if args.get("after") else None
+
+    def select(self):
+        model = self.model
+        stmt = db.select(*[getattr(model, field) for field in self.fields])
+        if self.where:
+            stmt = stmt.where(*self.where)
+
+        if self.sort == "id":
+            if self.after is not None:
+                stmt = stmt.where(model.id < self.after if self.descending else model.id > self.after)
+            return stmt.order_by(model.id.desc() if self.descending else model.id)
+
+        # (columna, id) para que el orden sea total aunque el valor se repita
+        keys = tuple_(getattr(model, self.sort), model.id)
+        if self.after is not None:
+            after = tuple_(*self.after)
+            stmt = stmt.where(keys < after if self.descending else keys > after)
+        if self.descending:
+            return stmt.order_by(getattr(model, self.sort).desc(), model.id.desc())
+        return stmt.order_by(getattr(model, self.sort), model.id)
+
+    def cursor(self, item):
+        if self.sort == "id":
+            return item["id"]
+        return encode_cursor(item[self.sort], item["id"])
+
+
+def keyset_page(query):
+    """
+    Returns (items, next_cursor). Rows are read in order starting right after the cursor,
+    one extra row is fetched to know if there is a next page without running a COUNT(*).
+    Only the requested columns are selected and each row tuple becomes a dict.
+    """
+    stmt = query.select().limit(query.limit + 1)
+    fields = query.fields
+    items = [dict(zip(fields, row)) for row in db.session.execute(stmt)]
+
+    next_cursor = None
+    if len(items) > query.limit:
+        items = items[:query.limit]
+        next_cursor = query.cursor(items[-1])
+    return items, next_cursor
+
+
+def iter_rows(query, limit=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yields every row after the cursor as a dict, or the first `limit` of them. yield_per
+    makes the driver fetch `batch_size` rows at a time (a server side cursor on Postgres),
+    so memory does not grow with the size of the table.
+    """
+    stmt = query.select()
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    stmt = stmt.execution_options(yield_per=batch_size)
+    fields = query.fields
+    for row in db.session.execute(stmt):
+        yield dict(zip(fields, row))
@@ -0,0 +1,74 @@
+"""
+Password hashing with a configurable KDF, run on a thread pool so the slow part
+does not hold the worker (or the gevent event loop).
+
+PASSWORD_HASH_METHOD uses the werkzeug format, for example:
+    scrypt:32768:8:1        (default, N:r:p)
+    pbkdf2:sha256:600000    (iterations)
+"""
+import os
+import hmac
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_THREADS = int(os.getenv("PASSWORD_HASH_THREADS", 4))
+
+_executor = None
+
+
+def _run(fn, *args):
+    # hashlib releases the GIL while it runs scrypt/pbkdf2, so real threads give parallelism.
+    # Under gevent the stdlib pool is monkey patched into greenlets, use the hub's native pool instead
+    try:
+        from gevent import monkey, get_hub
+        if monkey.is_module_patched("threading"):
+            return get_hub().threadpool.apply(fn, args)
+    except ImportError:
+        pass
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_THREADS, thread_name_prefix="password-hash")
+    return _executor.submit(fn, *args).result()
+
+
+def hash_password(password, method=None):
+    return _run(generate_password_hash, password, method or PASSWORD_HASH_METHOD)
+
+
+def is_hashed(stored):
+    return stored.startswith(("scrypt:", "pbkdf2:")) and "$" in stored
+
+
+def verify_password(stored, password):
+    if not is_hashed(stored):
+        # rows created before hashing was added hold the plain password
+        return hmac.compare_digest(stored.encode(), password.encode())
+    return _run(check_password_hash, stored, password)
+
+
+@functools.lru_cache(maxsize=None)
+def method_prefix(method):
+    # werkzeug completes short names ("scrypt" -> "scrypt:32768:8:1", "pbkdf2:sha256" ->
+    # "pbkdf2:sha256:<its default iterations>"): take what it writes in a real hash.
+    # Computed on first use and not at import, it costs one run of the KDF
+    return _run(generate_password_hash, "", method).split("$", 1)[0]
+
+
+def needs_rehash(stored):
+    # plain passwords and hashes made with a different method/work factor than the current one
+    return not is_hashed(stored) or stored.split("$", 1)[0] != method_prefix(PASSWORD_HASH_METHOD)
+
+
+def check_and_upgrade(user, password):
+    """
+    Verifies the password of `user` and, if it is right but stored with an old method or
+    work factor (or in plain text), replaces it with a fresh hash. The caller commits.
+    """
+    if not verify_password(user.password, password):
+        return False
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
@@ -0,0 +1,160 @@
+"""
+Token-bucket rate limiting for the write endpoints, per client IP or per user.
+
+Limits are written "<requests>/<period>" ("30/minute", "5/second"): the bucket holds up to
+<requests> tokens and refills at <requests> per <period>. A request that finds it empty
+gets a 429 with Retry-After.
+
+The bucket is stored as a single number per key, the time at which it will be full
+again (GCRA, equivalent to a token bucket), so a check is one read and one write:
+
+- MemoryBackend (default): a dict in the worker process, no lock. Two threads racing on
+  the same key can let one extra request through, which is fine for a limiter.
+- SharedBackend: the same check as a Lua script in Redis, shared by every worker.
+  RATELIMIT_STORAGE_URL=redis://... needs the `redis` package; any client with Redis'
+  eval() works, so a local stand-in (e.g. fakeredis) can take its place in development.
+"""
+import os
+import time
+import functools
+from flask import request, jsonify
+
+RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "1") == "1"
+RATELIMIT_STORAGE_URL = os.getenv("RATELIMIT_STORAGE_URL", "memory://")
+RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", 100000))
+RATELIMIT_TRUSTED_PROXIES = int(os.getenv("RATELIMIT_TRUSTED_PROXIES", 0))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_limit(limit):
+    # "30/minute" -> (30, 60.0)
+    try:
+        count, period = limit.split("/")
+        count = int(count)
+        period = float(PERIODS[period.strip()] if period.strip() in PERIODS else period)
+    except (ValueError, KeyError):
+        raise ValueError("Invalid rate limit: " + repr(limit))
+    if count < 1 or period <= 0:
+        raise ValueError("Invalid rate limit: " + repr(limit))
+    return count, period
+
+
+class MemoryBackend:
+
+    def __init__(self, max_keys=RATELIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def hit(self, key, count, period):
+        """
+        Takes one token from the bucket of `key`. Returns 0 when allowed, else the
+        seconds until a token is available.
+        """
+        now = time.monotonic()
+        interval = period / count
+        full_at = self._buckets.get(key, now)
+        if full_at < now:
+            full_at = now
+        wait = full_at + interval - period - now
+        if wait > 0:
+            return wait
+        self._buckets[key] = full_at + interval
+        if len(self._buckets) > self.max_keys:
+            self.prune(now)
+        return 0
+
+    def prune(self, now=None):
+        # A bucket that is full again holds nothing worth keeping
+        now = time.monotonic() if now is None else now
+        for key, full_at in list(self._buckets.items()):
+            if full_at < now:
+                self._buckets.pop(key, None)
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class SharedBackend:
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local full_at = tonumber(redis.call('GET', KEYS[1]) or now)
+if full_at < now then full_at = now end
+local wait = full_at + interval - period - now
+if wait > 0 then return tostring(wait) end
+redis.call('SET', KEYS[1], tostring(full_at + interval), 'PX', math.ceil(period * 1000))
+return '0'
+"""
+
+    def __init__(self, client, prefix="ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, count, period):
+        # Wall clock instead of monotonic: the value is compared across processes and hosts
+        wait = self.client.eval(self.SCRIPT, 1, self.prefix + key, time.time(), period / count, period)
+        return float(wait)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+def create_backend(url=RATELIMIT_STORAGE_URL):
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return SharedBackend(redis.Redis.from_url(url))
+    raise ValueError("Unsupported RATELIMIT_STORAGE_URL: " + url)
+
+
+backend = create_backend()
+
+
+def client_ip():
+    # Behind N proxies (Render, Heroku: 1) the client is the N-th address from the end of
+    # X-Forwarded-For; the ones before it are sent by the client and can not be trusted
+    forwarded = request.headers.get("X-Forwarded-For")
+    if RATELIMIT_TRUSTED_PROXIES and forwarded:
+        forwarded = forwarded.split(",")
+        if len(forwarded) >= RATELIMIT_TRUSTED_PROXIES:
+            return forwarded[-RATELIMIT_TRUSTED_PROXIES].strip()
+    return request.remote_addr or "unknown"
+
+
+def request_user_id():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and data.get("user_id") is not None:
+        return str(data["user_id"])
+    return None
+
+
+def rate_limit(limit, per="ip", scope=None):
+    """
+    Decorator for a route. per="ip" counts by client address; per="user" counts by
+    the user_id of the JSON body and falls back to the address when there is none.
+    Routes sharing a `scope` share their buckets (default: one bucket set per route).
+    Both can be stacked on the same route, since user_id is whatever the client sends.
+    """
+    count, period = parse_limit(limit)
+
+    def decorator(view):
+        name = scope or view.__name__
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if RATELIMIT_ENABLED:
+                identity = (request_user_id() if per == "user" else None) or client_ip()
+                key = name + ":" + per + ":" + identity
+                wait = backend.hit(key, count, period)
+                if wait:
+                    response = jsonify({"msg": "Too many requests"})
+                    response.status_code = 429
+                    response.headers["Retry-After"] = str(max(1, int(wait + 0.999)))
+                    return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
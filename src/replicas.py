@@ -0,0 +1,131 @@
+"""
+Read-replica routing. DATABASE_REPLICA_URLS is a comma separated list of database URLs
+that receive a copy of the primary (DATABASE_URL); each one becomes a Flask-SQLAlchemy
+bind ("replica_0", "replica_1"...). Without it everything runs on the primary as before.
+
+- SELECTs of GET/HEAD requests go to one replica per request, picked round-robin.
+  A request stays on the same replica so all its queries see the same snapshot.
+- Flushes, INSERT/UPDATE/DELETE statements, anything outside a request (CLI, seed)
+  and every query after a write in the same session run on the primary.
+- Read-your-own-writes: a request that wrote sets the REPLICA_STICKY_COOKIE cookie for
+  REPLICA_STICKY_SECONDS; GETs sending it back read from the primary, so a client that
+  just added a favourite sees it even if the replicas are behind.
+- Failover: a replica that raises a connection error is skipped for REPLICA_RETRY_SECONDS
+  and the GET is run again on another replica, and so on until it succeeds or no healthy
+  replica is left, then on the primary.
+
+Catalog responses read from a lagging replica can be cached (cache.py) until their TTL,
+keep CACHE_TTL above the usual replication lag.
+"""
+import os
+import time
+import itertools
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", 30))
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+REPLICA_STICKY_COOKIE = "read_primary"
+REPLICA_PREFIX = "replica_"
+SAFE_METHODS = ("GET", "HEAD")
+
+_round_robin = itertools.count()
+# engine -> time.monotonic() until which it is not used
+_down_until = {}
+
+
+def replica_binds(urls):
+    # "url1,url2" -> {"replica_0": "url1", "replica_1": "url2"}
+    urls = [url.strip().replace("postgres://", "postgresql://") for url in (urls or "").split(",") if url.strip()]
+    return {REPLICA_PREFIX + str(i): url for i, url in enumerate(urls)}
+
+
+def replica_status(engines):
+    now = time.monotonic()
+    return {
+        key: {"url": engine.url.render_as_string(hide_password=True), "healthy": _down_until.get(engine, 0) <= now}
+        for key, engine in engines.items() if key and key.startswith(REPLICA_PREFIX)
+    }
+
+
+def reads_from_replica():
+    if not has_request_context() or request.method not in SAFE_METHODS:
+        return False
+    return not request.cookies.get(REPLICA_STICKY_COOKIE)
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get("wrote"):
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info["wrote"] = True
+            elif reads_from_replica():
+                replica = self.info.get("replica") or self.pick_replica()
+                if replica is not None:
+                    g.replica = self.info["replica"] = replica
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def pick_replica(self):
+        replicas = [engine for key, engine in self._db.engines.items() if key and key.startswith(REPLICA_PREFIX)]
+        if not replicas:
+            return None
+        now = time.monotonic()
+        start = next(_round_robin)
+        for i in range(len(replicas)):
+            engine = replicas[(start + i) % len(replicas)]
+            if _down_until.setdefault(engine, 0) <= now:
+                return engine
+        return None
+
+
+def _mark_down(context):
+    # Only replicas are in _down_until (see pick_replica); errors on the primary are left alone
+    if context.engine not in _down_until:
+        return
+    if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+        _down_until[context.engine] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+
+def setup_replicas(app, db):
+    """
+    Registers the replicas of DATABASE_REPLICA_URLS as binds. Call before db.init_app(app),
+    which creates the engines. The session class must be RoutingSession (see models.py).
+    """
+    binds = replica_binds(os.getenv("DATABASE_REPLICA_URLS"))
+    if not binds:
+        return
+    app.config.setdefault("SQLALCHEMY_BINDS", {}).update(binds)
+
+    if not event.contains(Engine, "handle_error", _mark_down):
+        event.listen(Engine, "handle_error", _mark_down)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if db.session.info.get("wrote"):
+            response.set_cookie(REPLICA_STICKY_COOKIE, "1", max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+    @app.errorhandler(OperationalError)
+    def retry_read(error):
+        # The replica went away in the middle of a GET: start again on a fresh session.
+        # RoutingSession skips the replicas marked down, so every attempt goes to another
+        # one and, once none is left, to the primary: at most len(binds) + 1 attempts
+        if g.get("replica") is None:
+            raise error
+        for attempt in range(len(binds) + 1):
+            g.pop("replica", None)
+            db.session.remove()
+            try:
+                return app.dispatch_request()
+            except OperationalError as exc:
+                if g.get("replica") is None:
+                    # it failed on the primary, nothing left to try
+                    raise
+                error = exc
+        raise error
@@ -0,0 +1,198 @@
+"""
+Bulk seeding of the catalog tables from JSON / NDJSON / CSV files
+
+    flask seed planets planets.ndjson
+    flask seed characters people.csv --batch-size 5000
+    flask seed vehicles swapi_vehicles.json --no-copy
+
+Rows are upserted on `name` (unique): existing names get their other columns updated.
+On PostgreSQL each batch goes through COPY into a temporary table followed by one
+INSERT ... SELECT ... ON CONFLICT; elsewhere it is a multi-row INSERT ... ON CONFLICT.
+"""
+import io
+import os
+import csv
+import json
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Integer
+from models import db, Planets, Characters, Vehicles
+
+SEED_MODELS = {
+    "planets": Planets,
+    "characters": Characters,
+    "vehicles": Vehicles,
+}
+
+NULL_VALUES = ("", "unknown", "n/a", "none", "null")
+# Rango de INTEGER: un valor fuera haria fallar el lote entero en la base de datos
+INTEGER_MIN = -2 ** 31
+INTEGER_MAX = 2 ** 31 - 1
+
+
+def read_records(path, file_format=None):
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    with open(path, newline="", encoding="utf-8") as file:
+        if file_format in ("ndjson", "jsonl"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        elif file_format == "csv":
+            yield from csv.DictReader(file)
+        elif file_format == "json":
+            data = json.load(file)
+            # a plain list, or a SWAPI style page {"results": [...]}
+            yield from data["results"] if isinstance(data, dict) else data
+        else:
+            raise click.BadParameter("unknown format " + repr(file_format) + ", use json, ndjson or csv")
+
+
+def record_to_row(model, columns, record):
+    """
+    Keeps the model columns (never the id) and casts integers; None if the row is not usable,
+    e.g. an integer that is not a number or does not fit in INTEGER_MIN..INTEGER_MAX.
+    NULL_VALUES become None in integer and nullable columns and are kept as text elsewhere.
+    """
+    row = {}
+    for column in columns:
+        value = record.get(column.key)
+        if isinstance(value, str):
+            value = value.strip()
+            # SWAPI writes "unknown"/"n/a" for missing data. In a NOT NULL text column
+            # ("gender": "n/a" of droids, "climate": "unknown") that text is the value
+            if value.lower() in NULL_VALUES and (isinstance(column.type, Integer) or column.nullable):
+                value = None
+            elif isinstance(column.type, Integer):
+                value = value.replace(",", "")
+        if value is not None and isinstance(column.type, Integer):
+            # "1000", "1e6" o 1e6 de un JSON
+            try:
+                value = int(float(value))
+            except (TypeError, ValueError, OverflowError):
+                return None
+            if not INTEGER_MIN <= value <= INTEGER_MAX:
+                return None
+        if value is None and not column.nullable:
+            return None
+        row[column.key] = value
+    return row
+
+
+def upsert_statement(model, dialect_name):
+    # The dialect modules are imported here, only the one in use is loaded at startup
+    columns = [column.key for column in model.__table__.columns if column.key not in ("id", "name")]
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        stmt = postgresql.insert(model)
+        return stmt.on_conflict_do_update(index_elements=["name"], set_={c: stmt.excluded[c] for c in columns})
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects import sqlite
+        stmt = sqlite.insert(model)
+        return stmt.on_conflict_do_update(index_elements=["name"], set_={c: stmt.excluded[c] for c in columns})
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects import mysql
+        stmt = mysql.insert(model)
+        return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in columns})
+    return None
+
+
+def insert_batch(connection, model, stmt, rows):
+    if stmt is not None:
+        connection.execute(stmt, rows)
+        return
+    # dialects without upsert: update the names that exist, insert the rest
+    table = model.__table__
+    names = [row["name"] for row in rows]
+    existing = set(connection.scalars(db.select(table.c.name).where(table.c.name.in_(names))))
+    new_rows = [row for row in rows if row["name"] not in existing]
+    if new_rows:
+        connection.execute(table.insert(), new_rows)
+    for row in rows:
+        if row["name"] in existing:
+            connection.execute(table.update().where(table.c.name == row["name"]).values(**row))
+
+
+def copy_batch(connection, model, columns, rows):
+    table = model.__tablename__
+    names = [column.key for column in columns]
+    quoted = ", ".join('"' + name + '"' for name in names)
+    updates = ", ".join('"' + name + '" = EXCLUDED."' + name + '"' for name in names if name != "name")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if row[name] is None else row[name] for name in names])
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS "seed_' + table + '" ON COMMIT DELETE ROWS AS SELECT ' + quoted +
+                   ' FROM "' + table + '" WITH NO DATA')
+    cursor.copy_expert('COPY "seed_' + table + '" (' + quoted + ") FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    cursor.execute('INSERT INTO "' + table + '" (' + quoted + ") SELECT " + quoted + ' FROM "seed_' + table +
+                   '" ON CONFLICT (name) DO UPDATE SET ' + updates)
+    cursor.close()
+
+
+def seed_records(model, records, batch_size=1000, use_copy=None, progress=None):
+    """
+    Upserts `records` (an iterable of dicts) into the table of `model` in batches of
+    `batch_size`, one transaction per batch. Returns (loaded, rejected, seconds).
+    """
+    engine = db.engine
+    dialect_name = engine.dialect.name
+    if use_copy is None:
+        use_copy = dialect_name == "postgresql" and engine.dialect.driver == "psycopg2"
+    columns = [column for column in model.__table__.columns if column.key != "id"]
+    stmt = upsert_statement(model, dialect_name)
+
+    loaded = rejected = 0
+    start = time.perf_counter()
+
+    def flush(rows):
+        with engine.begin() as connection:
+            if use_copy:
+                copy_batch(connection, model, columns, rows)
+            else:
+                insert_batch(connection, model, stmt, rows)
+
+    batch = {}
+    for record in records:
+        row = record_to_row(model, columns, record)
+        if row is None:
+            rejected += 1
+            continue
+        # the same name twice in one batch would make ON CONFLICT touch a row twice: last one wins
+        batch[row["name"]] = row
+        if len(batch) >= batch_size:
+            flush(list(batch.values()))
+            loaded += len(batch)
+            batch = {}
+            if progress:
+                progress(loaded, rejected, time.perf_counter() - start)
+    if batch:
+        flush(list(batch.values()))
+        loaded += len(batch)
+
+    return loaded, rejected, time.perf_counter() - start
+
+
+@click.command("seed")
+@click.argument("entity", type=click.Choice(sorted(SEED_MODELS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["json", "ndjson", "csv"]), help="Defaults to the file extension.")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--copy/--no-copy", "use_copy", default=None, help="Use COPY (default: on PostgreSQL with psycopg2).")
+@with_appcontext
+def seed_command(entity, path, file_format, batch_size, use_copy):
+    """Load characters, planets or vehicles from a JSON, NDJSON or CSV file."""
+    last_report = [0]
+
+    def progress(loaded, rejected, seconds):
+        if seconds - last_report[0] >= 2:
+            last_report[0] = seconds
+            click.echo("%d rows, %d rejected, %.0f rows/s" % (loaded, rejected, loaded / seconds))
+
+    loaded, rejected, seconds = seed_records(SEED_MODELS[entity], read_records(path, file_format), batch_size, use_copy, progress)
+    click.echo("Done: %d %s upserted, %d rejected in %.1fs (%.0f rows/s)" % (
+        loaded, entity, rejected, seconds, loaded / seconds if seconds else 0))
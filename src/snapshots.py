@@ -0,0 +1,174 @@
+"""
+Catalog snapshots: the argument-less list responses (GET /planets, /characters, /vehicles)
+written to disk once and served from the file.
+
+The first GET of a list renders its JSON body as usual and writes it to SNAPSHOT_DIR as
+"<table>-<sha1 of the body>.json", plus .json.gz (and .json.br with `brotli`) copies.
+Later requests are answered with send_file(): no query, no serialization, no compression,
+and gunicorn hands the file to the kernel (sendfile) instead of copying it through Python.
+The sha1 is the ETag, the same one the cache (conditional.py) would give that body.
+
+Files are never modified, a change of content is a new file name. A snapshot belongs to
+the cache version of its table (cache.py): any insert/update/delete flushed by this
+process (API, admin) makes the next GET write a new one. Like the cache, a snapshot is
+also rebuilt after CACHE_TTL seconds, which picks up writes done by other processes
+(`flask seed`, other workers). Worker processes share SNAPSHOT_DIR and the files, the same
+body gives the same name so it is written only once.
+
+Each file can also be fetched by name from /snapshots/<name>: that URL never changes
+content, so it is sent with a one year `immutable` Cache-Control (see Content-Location in
+the list responses). Files no process has used for 2 x CACHE_TTL are deleted when a newer
+snapshot of the same table is written; their URL is a 404 from then on.
+"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timezone
+from flask import send_file
+from cache import cache, CACHE_TTL
+from compression import ENCODINGS, COMPRESS_MIN_SIZE, brotli, choose_encoding, compress
+from conditional import PUBLIC_CACHE_CONTROL, not_modified, response_304
+
+SNAPSHOTS = os.getenv("SNAPSHOTS", "1") == "1"
+SNAPSHOT_DIR = os.path.abspath(os.getenv("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "catalog-snapshots")))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+EXTENSIONS = {None: "", "gzip": ".gz", "br": ".br"}
+
+
+class Snapshot:
+
+    def __init__(self, tablename, version, name, etag, encodings):
+        self.tablename = tablename
+        self.version = version
+        self.name = name
+        self.etag = etag
+        self.encodings = encodings
+        self.expires = time.monotonic() + CACHE_TTL
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def is_current(self):
+        return self.version == cache.version(self.tablename) and self.expires > time.monotonic()
+
+
+# tabla -> Snapshot vigente en este proceso
+_current = {}
+_lock = threading.Lock()
+
+
+def _write(path, data):
+    # Se escribe aparte y se renombra: otro worker nunca ve un fichero a medias.
+    # Si ya existe solo se actualiza su mtime, que es lo que mira _prune
+    if os.path.exists(path):
+        os.utime(path)
+        return
+    fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _prune(tablename, keep):
+    # Un Snapshot se usa como mucho CACHE_TTL segundos desde que se escribio (o se toco) su fichero
+    expired = time.time() - 2 * CACHE_TTL
+    prefix = tablename + "-"
+    for name in os.listdir(SNAPSHOT_DIR):
+        if not name.startswith(prefix) or name.startswith(keep):
+            continue
+        path = os.path.join(SNAPSHOT_DIR, name)
+        try:
+            if os.path.getmtime(path) < expired:
+                os.remove(path)
+        except FileNotFoundError:
+            # lo ha borrado otro worker
+            pass
+
+
+def write_snapshot(tablename, version, body):
+    """
+    Writes body (and its compressed copies) under its content hash. `version` is the cache
+    version of the table read before the body was rendered. Returns the Snapshot.
+    """
+    etag = hashlib.sha1(body).hexdigest()
+    name = tablename + "-" + etag + ".json"
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    _write(os.path.join(SNAPSHOT_DIR, name), body)
+
+    encodings = []
+    if len(body) >= COMPRESS_MIN_SIZE:
+        for encoding in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            _write(os.path.join(SNAPSHOT_DIR, name + EXTENSIONS[encoding]), compress(body, encoding))
+            encodings.append(encoding)
+    _prune(tablename, keep=name)
+    return Snapshot(tablename, version, name, etag, tuple(encodings))
+
+
+def _send(name, encoding, cache_control):
+    response = send_file(os.path.join(SNAPSHOT_DIR, name + EXTENSIONS[encoding]),
+                         mimetype="application/json", etag=False, conditional=False, max_age=None)
+    del response.headers["Content-Disposition"]
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def snapshot_response(tablename, render):
+    """
+    Response for the argument-less list of `tablename` served from its snapshot file.
+    render() -> CachedResponse builds the body when there is no current snapshot;
+    non 200 responses (empty table) are returned as they are and not written.
+    """
+    snapshot = _current.get(tablename)
+    if snapshot is None or not snapshot.is_current():
+        with _lock:
+            snapshot = _current.get(tablename)
+            if snapshot is None or not snapshot.is_current():
+                # La version se lee antes de consultar: si hay una escritura mientras tanto,
+                # este snapshot ya nace caducado
+                version = cache.version(tablename)
+                rendered = render()
+                if rendered.status != 200:
+                    return rendered.to_response()
+                snapshot = _current[tablename] = write_snapshot(tablename, version, rendered.body)
+
+    matched = not_modified(snapshot.etag, snapshot.last_modified)
+    if matched:
+        return response_304(matched, snapshot.last_modified, PUBLIC_CACHE_CONTROL)
+
+    encoding = choose_encoding()
+    if encoding not in snapshot.encodings:
+        encoding = None
+    try:
+        response = _send(snapshot.name, encoding, PUBLIC_CACHE_CONTROL)
+    except FileNotFoundError:
+        # Borrado desde fuera (limpieza de /tmp...): se vuelve a escribir
+        _current.pop(tablename, None)
+        return snapshot_response(tablename, render)
+    response.set_etag(snapshot.etag + "-" + encoding if encoding else snapshot.etag)
+    response.last_modified = snapshot.last_modified
+    response.headers["Content-Location"] = "/snapshots/" + snapshot.name
+    return response
+
+
+def snapshot_file(name):
+    """Response for /snapshots/<name>, or None when there is no such snapshot."""
+    if os.path.basename(name) != name or not name.endswith(".json"):
+        return None
+    if not os.path.isfile(os.path.join(SNAPSHOT_DIR, name)):
+        return None
+    etag = name.rsplit("-", 1)[-1][:-len(".json")]
+    matched = not_modified(etag)
+    if matched:
+        return response_304(matched, cache_control=IMMUTABLE_CACHE_CONTROL)
+
+    encoding = choose_encoding()
+    if encoding is None or not os.path.isfile(os.path.join(SNAPSHOT_DIR, name + EXTENSIONS[encoding])):
+        encoding = None
+    response = _send(name, encoding, IMMUTABLE_CACHE_CONTROL)
+    response.set_etag(etag + "-" + encoding if encoding else etag)
+    return response
@@ -0,0 +1,229 @@
+"""
+Optional write-behind mode for favourite mutations (WRITE_BEHIND=1).
+
+The favourite POST/DELETE handlers validate the request, put the mutation in an
+in-process queue and answer 202 without waiting for the database. One background
+thread per worker process takes what is queued, waits up to WRITE_BEHIND_LINGER_MS for
+more, and applies up to WRITE_BEHIND_BATCH_SIZE mutations in a single transaction:
+
+- Ordering: there is a single consumer and the queue is FIFO, so the mutations of a user
+  are applied in the order they were accepted. Inside a batch only the last mutation
+  of each (user, type, id) is kept; mutations of different favourites commute.
+- Backpressure: at most WRITE_BEHIND_MAX_PENDING mutations can be accepted and not yet
+  written, past that the handlers answer 503 with Retry-After instead of queueing.
+- Failures: a batch that hits an IntegrityError (a user deleted meanwhile...) is applied
+  again user by user so one bad mutation does not drop the others; connection errors are
+  retried a few times before the batch is given up and logged. Any other error drops and
+  logs the batch, the thread goes on with the next one.
+- Shutdown: drain_all() (gunicorn's worker_exit hook in gunicorn.conf.py, and atexit)
+  applies whatever is still queued before the process exits.
+
+A 202 means the change is accepted, not visible yet: a GET right after it may not see it.
+"""
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from flask import current_app, jsonify
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db
+from favourites import stage_add_favourites, stage_remove_favourites
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 10000))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 500))
+WRITE_BEHIND_LINGER_MS = float(os.getenv("WRITE_BEHIND_LINGER_MS", 5))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", 25))
+RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+_queues = []
+
+
+class WriteBehindQueue:
+
+    def __init__(self, app, max_pending=WRITE_BEHIND_MAX_PENDING, batch_size=WRITE_BEHIND_BATCH_SIZE,
+                 linger=WRITE_BEHIND_LINGER_MS / 1000):
+        self.app = app
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_pending = max_pending
+        # Accepted and not applied yet, in the queue or in the batch being written
+        self.pending = 0
+        self.queue = queue.Queue()
+        self.accepted = 0
+        self.rejected = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.batches = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, targets, op):
+        """Queues op ("add" or "remove") for every target of {"planet": [ids], ...}. False when full."""
+        items = [(user_id, kind, target_id, op) for kind, ids in targets.items() for target_id in ids]
+        self._ensure_started()
+        with self._lock:
+            # Todo o nada: un lote no se acepta a medias
+            if self.pending + len(items) > self.max_pending:
+                self.rejected += len(items)
+                return False
+            for item in items:
+                self.queue.put_nowait(item)
+            self.pending += len(items)
+            self.accepted += len(items)
+        return True
+
+    def _ensure_started(self):
+        # Started on first use and not in __init__: a thread started before gunicorn forks
+        # the workers would not exist in them
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0.0001))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self.apply(batch)
+            except Exception:
+                # Un error inesperado no puede parar el hilo: el lote se da por perdido y se sigue
+                logger.exception("write-behind: dropping a batch of %d favourite mutations", len(batch))
+                self.failed += len(batch)
+                with self.app.app_context():
+                    db.session.rollback()
+            finally:
+                with self._lock:
+                    self.pending -= len(batch)
+
+    def apply(self, batch):
+        # (user, tipo, id) -> ultima operacion; los usuarios en el orden en que llegaron
+        final = {}
+        for user_id, kind, target_id, op in batch:
+            final[(user_id, kind, target_id)] = op
+        self.coalesced += len(batch) - len(final)
+        per_user = {}
+        for (user_id, kind, target_id), op in final.items():
+            per_user.setdefault(user_id, {"add": {}, "remove": {}})[op].setdefault(kind, []).append(target_id)
+
+        with self.app.app_context():
+            for attempt in range(RETRIES):
+                try:
+                    try:
+                        for user_id, ops in per_user.items():
+                            self._stage(user_id, ops)
+                        db.session.commit()
+                        dropped = 0
+                    except IntegrityError:
+                        db.session.rollback()
+                        dropped = self._apply_per_user(per_user)
+                    break
+                except OperationalError:
+                    db.session.rollback()
+                    if attempt == RETRIES - 1:
+                        logger.exception("write-behind: dropping a batch of %d favourite mutations", len(final))
+                        self.failed += len(final)
+                        return
+                    time.sleep(0.5 * 2 ** attempt)
+        self.applied += len(final) - dropped
+        self.failed += dropped
+        self.batches += 1
+
+    def _stage(self, user_id, ops):
+        if ops["remove"]:
+            stage_remove_favourites(user_id, ops["remove"])
+        if ops["add"]:
+            stage_add_favourites(user_id, ops["add"])
+
+    def _apply_per_user(self, per_user):
+        # Returns how many mutations had to be dropped
+        dropped = 0
+        for user_id, ops in per_user.items():
+            try:
+                self._stage(user_id, ops)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                count = sum(len(ids) for targets in ops.values() for ids in targets.values())
+                logger.warning("write-behind: dropping %d favourite mutations of user %s", count, user_id)
+                dropped += count
+        return dropped
+
+    def drain(self, timeout=WRITE_BEHIND_DRAIN_TIMEOUT):
+        """Applies everything queued and stops the thread. Returns the mutations left behind."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+        return self.pending
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "applied": self.applied,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "batches": self.batches
+        }
+
+
+def queue_favourites(user_id, targets, op):
+    """
+    In write-behind mode queues the mutation and returns the response for the client
+    (202, or 503 when the queue is full). Returns None when the mode is off.
+    """
+    write_behind = current_app.extensions.get("write_behind")
+    if write_behind is None:
+        return None
+    # Mutations of the same user are coalesced by user_id: "1" and 1 must be the same key
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return jsonify({"msg": "user_id must be an integer"}), 400
+    if not write_behind.submit(user_id, targets, op):
+        response = jsonify({"msg": "Too many pending favourite changes, retry later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+    return jsonify({"msg": "Favourite change accepted", "status": "queued"}), 202
+
+
+def drain_all(timeout=WRITE_BEHIND_DRAIN_TIMEOUT):
+    for write_behind in _queues:
+        left = write_behind.drain(timeout)
+        if left:
+            logger.error("write-behind: %d favourite mutations not applied at shutdown", left)
+
+
+def setup_write_behind(app, enabled=WRITE_BEHIND):
+    if not enabled:
+        return
+    write_behind = WriteBehindQueue(app)
+    app.extensions["write_behind"] = write_behind
+    if not _queues:
+        atexit.register(drain_all)
+    _queues.append(write_behind)
@@ -1,7 +1,12 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
+#
+# Migrations run from the CLI (`flask db upgrade`), the workers do not need Flask-Migrate.
+# Set APP_ADMIN=0 / APP_SWAGGER=0 on API-only nodes to skip Flask-Admin and the spec as well.
 
-from app import app as application
+from app import create_app
+
+application = create_app({"MIGRATE": False})
 
 if __name__ == "__main__":
     application.run()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app modules import each other by name (from models import db), as when run from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
@@ -0,0 +1,104 @@
+"""
+Catalog response cache (cache.py): entries are dropped when a write to their table is
+committed, including a write that commits while the entry is being built.
+"""
+import pytest
+
+from app import create_app, cached_response
+from cache import cache, LRUCache, MISSING
+from models import db, Planets, Vehicles
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    cache.clear()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(Planets(name="Old", climate="arid", diameter=1, population=1))
+        db.session.add(Vehicles(name="Sand Crawler", crew=46, cargo_capacity=50000, manufacturer="Corellia"))
+        db.session.commit()
+    yield app
+
+
+def test_commit_invalidates_cached_detail(app):
+    client = app.test_client()
+    assert client.get("/planets/1").get_json()["planet"]["name"] == "Old"
+
+    with app.app_context():
+        db.session.get(Planets, 1).name = "New"
+        db.session.commit()
+
+    assert client.get("/planets/1").get_json()["planet"]["name"] == "New"
+
+
+def test_second_read_is_a_hit(app):
+    client = app.test_client()
+    client.get("/planets/1")
+    hits = cache.hits
+
+    assert client.get("/planets/1").status_code == 200
+    assert cache.hits == hits + 1
+
+
+def test_insert_invalidates_cached_list(app):
+    client = app.test_client()
+    assert len(client.get("/planets?limit=10").get_json()["planets"]) == 1
+
+    with app.app_context():
+        db.session.add(Planets(name="Hoth", climate="frozen", diameter=2, population=2))
+        db.session.commit()
+
+    assert [p["name"] for p in client.get("/planets?limit=10").get_json()["planets"]] == ["Old", "Hoth"]
+
+
+def test_write_to_another_table_keeps_entries(app):
+    client = app.test_client()
+    client.get("/planets/1")
+
+    with app.app_context():
+        db.session.get(Vehicles, 1).crew = 47
+        db.session.commit()
+    hits = cache.hits
+
+    client.get("/planets/1")
+    assert cache.hits == hits + 1
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    lru = LRUCache(maxsize=2, ttl=60)
+    lru.set("planet", 1, "a")
+    lru.set("planet", 2, "b")
+    lru.get("planet", 1)
+    lru.set("planet", 3, "c")
+
+    assert lru.get("planet", 2) is MISSING
+    assert (lru.get("planet", 1), lru.get("planet", 3)) == ("a", "c")
+
+
+def test_expired_entry_is_a_miss():
+    lru = LRUCache(maxsize=2, ttl=-1)
+    lru.set("planet", 1, "a")
+
+    assert lru.get("planet", 1) is MISSING
+
+
+def test_entry_built_before_a_concurrent_commit_is_not_served(app):
+    with app.test_request_context("/planets/1"):
+        def build_with_concurrent_write():
+            payload = {"name": db.session.get(Planets, 1).name}
+            # another request renames the planet between the query and cache.set()
+            db.session.get(Planets, 1).name = "New"
+            db.session.commit()
+            return payload, 200
+
+        stale = cached_response(Planets, 1, build_with_concurrent_write)
+        assert stale.get_json() == {"name": "Old"}
+
+        fresh = cached_response(Planets, 1, lambda: ({"name": db.session.get(Planets, 1).name}, 200))
+        assert fresh.get_json() == {"name": "New"}
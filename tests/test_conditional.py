@@ -0,0 +1,79 @@
+"""
+Conditional GET (conditional.py): ETag / Last-Modified validators and 304 responses,
+also for the gzip representation of a body.
+"""
+import pytest
+
+from app import create_app
+from cache import cache
+from models import db, Planets, User
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    cache.clear()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        # enough rows for the list to be over COMPRESS_MIN_SIZE
+        for i in range(40):
+            db.session.add(Planets(name="Planet %d" % i, climate="arid", diameter=i, population=i))
+        db.session.add(User(email="user@example.com", password="x", username="u", name="U", lastname="L"))
+        db.session.commit()
+    return app.test_client()
+
+
+def test_matching_etag_is_304_without_body(client):
+    first = client.get("/planets/1")
+
+    response = client.get("/planets/1", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.headers["ETag"] == first.headers["ETag"]
+    assert response.headers["Cache-Control"] == first.headers["Cache-Control"]
+
+
+def test_other_etag_is_200(client):
+    response = client.get("/planets/1", headers={"If-None-Match": '"0000"'})
+
+    assert response.status_code == 200
+    assert response.get_json()["planet"]["id"] == 1
+
+
+def test_if_modified_since(client):
+    last_modified = client.get("/planets/1").headers["Last-Modified"]
+
+    assert client.get("/planets/1", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/planets/1", headers={"If-Modified-Since": "Sat, 01 Jan 2000 00:00:00 GMT"}).status_code == 200
+
+
+def test_gzip_body_has_its_own_etag(client):
+    plain = client.get("/planets?limit=40")
+    gzipped = client.get("/planets?limit=40", headers={"Accept-Encoding": "gzip"})
+
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    for etag in (plain.headers["ETag"], gzipped.headers["ETag"]):
+        response = client.get("/planets?limit=40", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert response.status_code == 304
+
+
+def test_user_data_is_revalidated(client):
+    first = client.get("/1/favourites")
+
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    assert client.get("/1/favourites", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_write_changes_the_etag(client):
+    etag = client.get("/1/favourites").headers["ETag"]
+
+    client.post("/favourite/planet/1", json={"user_id": 1})
+
+    assert client.get("/1/favourites", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,40 @@
+"""
+POST/DELETE /favourites/batch (favourites.py): the body is validated before any query.
+"""
+import pytest
+
+from app import create_app
+from models import db, User, Planets
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(Planets(name="Tatooine", climate="arid", diameter=1, population=1))
+        db.session.add(User(email="user@example.com", password="x", username="u", name="U", lastname="L"))
+        db.session.commit()
+    return app.test_client()
+
+
+@pytest.mark.parametrize("user_id", ["1", 1.0, True, -1, 2 ** 31, [1]])
+@pytest.mark.parametrize("method", ["POST", "DELETE"])
+def test_invalid_user_id_is_400(client, method, user_id):
+    response = client.open("/favourites/batch", method=method, json={"user_id": user_id, "planet": [1]})
+
+    assert response.status_code == 400
+    assert response.get_json()["message"].startswith("user_id must be an id")
+
+
+def test_batch_add_then_remove(client):
+    added = client.post("/favourites/batch", json={"user_id": 1, "planet": [1, 2]}).get_json()
+    removed = client.delete("/favourites/batch", json={"user_id": 1, "planet": [1]}).get_json()
+
+    assert [r["status"] for r in added["results"]] == ["created", "not_found"]
+    assert [r["status"] for r in removed["results"]] == ["deleted"]
@@ -0,0 +1,73 @@
+"""
+GET /<user_id>/favourites?expand=1 must run the same number of queries however many
+favourites the user has (no query per favourite to load its planet/vehicle/character).
+"""
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from models import db, User, Planets, Vehicles, Characters, Favourites
+
+N = 5
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    with app.app_context():
+        db.create_all()
+        for i in range(3 * 10 * N):
+            db.session.add(Planets(name="Planet %d" % i, climate="arid", diameter=i, population=i))
+            db.session.add(Vehicles(name="Vehicle %d" % i, crew=i, cargo_capacity=i, manufacturer="Kuat"))
+            db.session.add(Characters(name="Character %d" % i, gender="n/a", birth_year="unknown", height=i, eye_color="red"))
+        for i in (1, 2):
+            db.session.add(User(email="user%d@example.com" % i, password="x", username="u%d" % i, name="U", lastname="L"))
+        db.session.commit()
+    yield app
+
+
+def add_favourites(user_id, count):
+    # count favourites of each type, with different targets for each user
+    offset = (user_id - 1) * count
+    for i in range(1, count + 1):
+        db.session.add(Favourites(user_id=user_id, planet_id=offset + i))
+        db.session.add(Favourites(user_id=user_id, vehicle_id=offset + i))
+        db.session.add(Favourites(user_id=user_id, character_id=offset + i))
+    db.session.commit()
+
+
+def count_queries(app, client, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+def test_expand_runs_a_fixed_number_of_queries(app):
+    with app.app_context():
+        add_favourites(1, N)
+        add_favourites(2, 10 * N)
+    client = app.test_client()
+
+    few, few_body = count_queries(app, client, "/1/favourites?expand=1")
+    many, many_body = count_queries(app, client, "/2/favourites?expand=1")
+
+    assert len(few_body["favourites"]["favourites"]) == 3 * N
+    assert len(many_body["favourites"]["favourites"]) == 3 * 10 * N
+    assert all(f["planet"] or f["vehicle"] or f["character"] for f in many_body["favourites"]["favourites"])
+    assert few == many
@@ -0,0 +1,85 @@
+"""
+Idempotency-Key on POST (idempotency.py): a retry gets the first response replayed and
+the handler does not run again.
+"""
+import pytest
+
+import idempotency
+from app import create_app
+from models import db, User, Favourites, Planets
+
+USER = {"email": "new@example.com", "password": "secret", "username": "new", "name": "New", "lastname": "User"}
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    idempotency.store.clear()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(Planets(name="Tatooine", climate="arid", diameter=1, population=1))
+        db.session.commit()
+    yield app
+
+
+def test_retry_is_replayed(app):
+    client = app.test_client()
+    headers = {"Idempotency-Key": "create-user-1"}
+
+    first = client.post("/user", json=USER, headers=headers)
+    retry = client.post("/user", json=USER, headers=headers)
+
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_data() == first.get_data()
+    with app.app_context():
+        assert User.query.count() == 1
+
+
+def test_replayed_favourite_is_added_once(app):
+    client = app.test_client()
+    client.post("/user", json=USER)
+    headers = {"Idempotency-Key": "favourite-1"}
+
+    statuses = [client.post("/favourite/planet/1", json={"user_id": 1}, headers=headers).status_code for _ in range(3)]
+
+    assert statuses == [201, 201, 201]
+    with app.app_context():
+        assert Favourites.query.count() == 1
+
+
+def test_key_reused_with_another_body_is_422(app):
+    client = app.test_client()
+    headers = {"Idempotency-Key": "create-user-1"}
+    client.post("/user", json=USER, headers=headers)
+
+    response = client.post("/user", json=dict(USER, email="other@example.com"), headers=headers)
+
+    assert response.status_code == 422
+
+
+def test_request_in_progress_is_409(app):
+    idempotency._in_flight.add(("/user", "slow"))
+    try:
+        response = app.test_client().post("/user", json=USER, headers={"Idempotency-Key": "slow"})
+    finally:
+        idempotency._in_flight.discard(("/user", "slow"))
+
+    assert response.status_code == 409
+
+
+def test_without_key_nothing_is_replayed(app):
+    client = app.test_client()
+    client.post("/user", json=USER)
+
+    response = client.post("/user", json=USER)
+
+    assert "Idempotent-Replayed" not in response.headers
+    assert response.status_code != 201
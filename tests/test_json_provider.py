@@ -0,0 +1,30 @@
+"""
+Both JSON providers (json_provider.py) must give the same body, and so the same ETag.
+"""
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+
+from json_provider import OrjsonProvider, UTF8JSONProvider
+
+pytest.importorskip("orjson")
+
+PAYLOAD = {
+    "planet": {"name": "Bespín", "climate": "temperate", "population": 6000000, "gravity": 1.5},
+    "created": datetime(2024, 5, 4, 12, 0, tzinfo=timezone.utc),
+    "films": ["Ep. V — The Empire Strikes Back", None, True],
+}
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_providers_give_the_same_body(app):
+    default = UTF8JSONProvider(app).response(PAYLOAD).get_data()
+    fast = OrjsonProvider(app).response(PAYLOAD).get_data()
+
+    assert default == fast
+    assert "Bespín".encode() in fast
@@ -0,0 +1,40 @@
+"""
+?ids= on the list endpoints: the requested rows in request order, with ?fields= only.
+"""
+import pytest
+
+from app import create_app
+from cache import cache
+from models import db, Planets
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    cache.clear()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        for name, climate in (("Tatooine", "arid"), ("Alderaan", "temperate"), ("Hoth", "frozen")):
+            db.session.add(Planets(name=name, climate=climate, diameter=1, population=1))
+        db.session.commit()
+    return app.test_client()
+
+
+def test_ids_in_request_order_with_missing(client):
+    body = client.get("/planets?ids=3,1,9&fields=name").get_json()
+
+    assert [planet["name"] for planet in body["planets"]] == ["Hoth", "Tatooine"]
+    assert body["missing"] == [9]
+
+
+@pytest.mark.parametrize("args", ["climate=arid", "sort=-name", "q=tat", "after=abc", "limit=1"])
+def test_ids_combined_with_other_arguments_is_400(client, args):
+    response = client.get("/planets?ids=1,2&" + args)
+
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "ids can not be combined with " + args.split("=")[0]
@@ -0,0 +1,67 @@
+"""
+Keyset pagination of the list endpoints (pagination.py): ?limit= and ?after= walk a list
+once, in order, whatever is inserted or deleted between pages.
+"""
+import pytest
+
+from app import create_app
+from cache import cache
+from models import db, Planets
+
+POPULATIONS = [30, 10, 20, 10, 30, 20, 10]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    cache.clear()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        for i, population in enumerate(POPULATIONS, 1):
+            db.session.add(Planets(name="Planet %d" % i, climate="arid", diameter=i, population=population))
+        db.session.commit()
+    yield app
+
+
+def walk(client, url):
+    pages = []
+    while url:
+        body = client.get(url).get_json()
+        pages.append(body["planets"])
+        url = body["next"]
+    return pages
+
+
+def test_pages_by_id(app):
+    pages = walk(app.test_client(), "/planets?limit=3")
+
+    assert [[planet["id"] for planet in page] for page in pages] == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_pages_by_a_column_with_repeated_values(app):
+    pages = walk(app.test_client(), "/planets?limit=2&sort=-population&fields=population")
+
+    rows = [(planet["population"], planet["id"]) for page in pages for planet in page]
+    assert rows == sorted(((p, i) for i, p in enumerate(POPULATIONS, 1)), key=lambda row: (-row[0], -row[1]))
+    assert all(set(planet) == {"id", "population"} for page in pages for planet in page)
+
+
+def test_a_delete_between_pages_does_not_skip_rows(app):
+    client = app.test_client()
+    first = client.get("/planets?limit=3").get_json()
+
+    with app.app_context():
+        db.session.delete(db.session.get(Planets, 1))
+        db.session.commit()
+    second = client.get(first["next"]).get_json()
+
+    assert [planet["id"] for planet in second["planets"]] == [4, 5, 6]
+
+
+def test_invalid_cursor_is_400(app):
+    assert app.test_client().get("/planets?sort=name&after=not-a-cursor").status_code == 400
@@ -0,0 +1,49 @@
+"""
+Read replicas: a GET that hits dead replicas is retried on the next one and finally on
+the primary, inside the same request.
+"""
+import pytest
+
+import replicas
+from app import create_app
+from models import db, Planets
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Two replicas whose database can not be opened
+    dead = ["sqlite:///" + str(tmp_path / "missing" / name) for name in ("a.db", "b.db")]
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", ",".join(dead))
+    monkeypatch.setattr(replicas, "_down_until", {})
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "primary.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(Planets(name="Tatooine", climate="arid", diameter=10465, population=200000))
+        db.session.commit()
+    yield app
+
+
+def test_get_falls_back_to_the_primary_when_every_replica_is_down(app):
+    client = app.test_client()
+
+    response = client.get("/planets/1")
+
+    assert response.status_code == 200
+    assert response.get_json()["planet"]["name"] == "Tatooine"
+    with app.app_context():
+        status = replicas.replica_status(db.engines)
+    assert [entry["healthy"] for entry in status.values()] == [False, False]
+
+
+def test_writes_never_use_the_replicas(app):
+    client = app.test_client()
+
+    response = client.post("/user", json={"email": "a@example.com", "password": "secret",
+                                          "username": "a", "name": "A", "lastname": "B"})
+
+    assert response.status_code in (200, 201)
@@ -0,0 +1,31 @@
+"""
+flask seed (seed.py): rows that the database would refuse are rejected one by one
+instead of failing their whole batch.
+"""
+import pytest
+
+from seed import record_to_row
+from models import Planets
+
+COLUMNS = [column for column in Planets.__table__.columns if column.key != "id"]
+
+
+def planet(**values):
+    record = {"name": "Tatooine", "climate": "arid", "diameter": "10465", "population": "200000"}
+    record.update(values)
+    return record_to_row(Planets, COLUMNS, record)
+
+
+def test_integers_are_cast():
+    assert planet(diameter="10,465", population=2e5) == {
+        "name": "Tatooine", "climate": "arid", "diameter": 10465, "population": 200000}
+
+
+@pytest.mark.parametrize("population", ["1000000000000", 2 ** 31, -2 ** 31 - 1, "1e400", "nan", "many"])
+def test_integer_out_of_range_or_invalid_is_rejected(population):
+    assert planet(population=population) is None
+
+
+def test_integer_limits_are_kept():
+    assert planet(population=str(2 ** 31 - 1))["population"] == 2 ** 31 - 1
+    assert planet(population=-2 ** 31)["population"] == -2 ** 31
@@ -0,0 +1,86 @@
+"""
+Catalog snapshots (snapshots.py): the argument-less lists are written to a file once and
+a new file is written after a write to the table.
+"""
+import os
+
+import pytest
+
+import snapshots
+from app import create_app
+from cache import cache
+from models import db, Planets
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(snapshots, "_current", {})
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+    })
+    cache.clear()
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(Planets(name="Tatooine", climate="arid", diameter=1, population=1))
+        db.session.commit()
+    yield app
+
+
+def files():
+    return sorted(os.listdir(snapshots.SNAPSHOT_DIR))
+
+
+def test_list_is_served_from_its_snapshot(app):
+    client = app.test_client()
+
+    first = client.get("/planets")
+    second = client.get("/planets")
+
+    name = first.headers["Content-Location"].rsplit("/", 1)[-1]
+    assert files() == [name]
+    assert first.headers["ETag"] == second.headers["ETag"] == '"%s"' % name[len("planet-"):-len(".json")]
+    assert second.get_data() == first.get_data()
+    assert [p["name"] for p in second.get_json()["planets"]] == ["Tatooine"]
+    assert client.get("/planets", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_write_makes_a_new_snapshot(app):
+    client = app.test_client()
+    old = client.get("/planets")
+
+    with app.app_context():
+        db.session.add(Planets(name="Hoth", climate="frozen", diameter=2, population=2))
+        db.session.commit()
+    new = client.get("/planets")
+
+    assert new.headers["ETag"] != old.headers["ETag"]
+    assert [p["name"] for p in new.get_json()["planets"]] == ["Tatooine", "Hoth"]
+    # the old file stays until it has not been used for 2 x CACHE_TTL
+    assert len(files()) == 2
+    assert client.get(old.headers["Content-Location"]).status_code == 200
+
+
+def test_snapshot_url_is_immutable(app):
+    client = app.test_client()
+    location = client.get("/planets").headers["Content-Location"]
+
+    response = client.get(location)
+
+    assert response.headers["Cache-Control"] == snapshots.IMMUTABLE_CACHE_CONTROL
+    assert client.get("/snapshots/planet-0000.json").status_code == 404
+
+
+def test_deleted_file_is_written_again(app):
+    client = app.test_client()
+    first = client.get("/planets")
+    os.remove(os.path.join(snapshots.SNAPSHOT_DIR, files()[0]))
+
+    second = client.get("/planets")
+
+    assert second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert len(files()) == 1
@@ -0,0 +1,106 @@
+"""
+Single favourite routes (POST/DELETE /favourite/<type>/<id>) with and without the
+write-behind queue, and the queue itself (writebehind.py): coalescing and backpressure.
+"""
+import pytest
+
+from app import create_app
+from models import db, User, Planets, Vehicles, Characters, Favourites, FavouriteCounts
+from writebehind import WriteBehindQueue
+
+
+@pytest.fixture(params=[False, True], ids=["sync", "write-behind"])
+def app(request, tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+        "WRITE_BEHIND": request.param,
+    })
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add(Planets(name="Tatooine", climate="arid", diameter=1, population=1))
+        db.session.add(Vehicles(name="Sand Crawler", crew=1, cargo_capacity=1, manufacturer="Corellia"))
+        db.session.add(Characters(name="Luke", gender="male", birth_year="19BBY", height=172, eye_color="blue"))
+        db.session.add(User(email="user@example.com", password="x", username="u", name="U", lastname="L"))
+        db.session.commit()
+    yield app
+    if "write_behind" in app.extensions:
+        app.extensions["write_behind"].drain()
+
+
+@pytest.mark.parametrize("kind", ["planet", "character", "vehicle"])
+@pytest.mark.parametrize("method", ["POST", "DELETE"])
+def test_missing_target_is_404(app, kind, method):
+    response = app.test_client().open("/favourite/%s/999" % kind, method=method, json={"user_id": 1})
+    assert response.status_code == 404
+    assert response.get_json() == {"msg": kind.capitalize() + " does not exist"}
+
+
+@pytest.mark.parametrize("kind", ["planet", "character", "vehicle"])
+def test_existing_target_is_accepted(app, kind):
+    response = app.test_client().post("/favourite/%s/1" % kind, json={"user_id": 1})
+    assert response.status_code == (202 if app.config["WRITE_BEHIND"] else 201)
+
+
+@pytest.fixture
+def queue_app(tmp_path):
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "ADMIN": False,
+        "SWAGGER": False,
+        "MIGRATE": False,
+        "WRITE_BEHIND": False,
+    })
+    with app.app_context():
+        db.create_all(bind_key=None)
+        for name in ("Tatooine", "Hoth"):
+            db.session.add(Planets(name=name, climate="arid", diameter=1, population=1))
+        for i in (1, 2):
+            db.session.add(User(email="user%d@example.com" % i, password="x", username="u", name="U", lastname="L"))
+        db.session.commit()
+    return app
+
+
+def favourites(app):
+    with app.app_context():
+        rows = {(f.user_id, f.planet_id) for f in Favourites.query.all()}
+        counts = {c.target_id: c.count for c in FavouriteCounts.query.filter_by(kind="planet")}
+    return rows, counts
+
+
+def test_batch_keeps_the_last_mutation_of_each_favourite(queue_app):
+    queue = WriteBehindQueue(queue_app)
+
+    queue.apply([
+        (1, "planet", 1, "add"),
+        (1, "planet", 1, "remove"),
+        (2, "planet", 1, "add"),
+        (1, "planet", 1, "add"),
+        (1, "planet", 2, "add"),
+        (1, "planet", 2, "remove"),
+    ])
+
+    assert favourites(queue_app) == ({(1, 1), (2, 1)}, {1: 2})
+    assert (queue.applied, queue.coalesced, queue.batches) == (3, 3, 1)
+
+
+def test_queued_mutations_are_applied_in_order(queue_app):
+    queue = WriteBehindQueue(queue_app, linger=0.05)
+
+    for op in ("add", "remove", "add"):
+        assert queue.submit(1, {"planet": [1, 2]}, op)
+    assert queue.drain() == 0
+
+    assert favourites(queue_app)[0] == {(1, 1), (1, 2)}
+    assert queue.stats()["accepted"] == 6
+
+
+def test_full_queue_rejects_the_whole_request(queue_app):
+    queue = WriteBehindQueue(queue_app, max_pending=3)
+    queue.pending = 2
+
+    assert not queue.submit(1, {"planet": [1, 2]}, "add")
+    assert queue.stats()["rejected"] == 2
+    assert queue.queue.empty()